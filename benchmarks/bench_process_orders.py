@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+"""Benchmark of OrderPortal.process_orders on a large synthetic set of orders.
+
+Compares the current implementation to the previous one, which parsed every
+closed date with strptime and re-sorted the events of an orderer for each
+added project.
+
+    python -m benchmarks.bench_process_orders [nr_orders]
+"""
+
+# Standard
+import datetime
+import random
+import sys
+import time
+import types
+
+# Own
+from daily_read import config, ngi_data, order_portal
+
+STATUSES = list(ngi_data.ProjectDataRecord.dates_prio.keys())[:-1]
+
+
+def synthetic_data(nr_orders, nr_orderers=500, seed=1):
+    rng = random.Random(seed)
+    start = datetime.date(2015, 1, 1)
+    data = {}
+    orders = []
+    for i in range(nr_orders):
+        portal_id = f"NGI{i:07d}"
+        dates = sorted(start + datetime.timedelta(days=rng.randrange(3500)) for _ in range(4))
+        project_dates = {date.isoformat(): [STATUSES[j]] for j, date in enumerate(dates)}
+        orderer = f"pi_{rng.randrange(nr_orderers)}@example.com"
+        data[portal_id] = ngi_data.ProjectDataRecord(f"NGIS/2023/{portal_id}.json", orderer, project_dates)
+        status = rng.choice(["closed", "accepted", "processing"])
+        orders.append(
+            {
+                "identifier": portal_id,
+                "status": status,
+                "history": {"closed": dates[-1].isoformat() if status == "closed" else None},
+                "reports": [],
+            }
+        )
+    return data, orders
+
+
+def previous_process_orders(op, closed_before_in_days=30):
+    order_updates = {}
+    pull_date = datetime.datetime.now()
+    older_than_cutoff = (pull_date - datetime.timedelta(days=closed_before_in_days)).date()
+    for order in op.all_orders:
+        if (
+            order["status"] == "closed"
+            and datetime.datetime.strptime(order["history"]["closed"], "%Y-%m-%d").date() >= older_than_cutoff
+        ):
+            continue
+        elif order["identifier"] not in op.projects_data.data.keys():
+            continue
+        proj_info = op.projects_data.data[order["identifier"]]
+        if proj_info.orderer not in order_updates:
+            order_updates[proj_info.orderer] = {
+                "pull_date": f"{pull_date}",
+                "active_projects": 0,
+                "recents": {},
+                "events": [],
+                "projects": {},
+            }
+        order_updates_item = order_updates[proj_info.orderer]
+        order_updates_item["events"] += proj_info.events
+        order_updates_item["recents"] = sorted(order_updates_item["events"], reverse=True)[:5]
+        order_updates_item["projects"].setdefault(proj_info.status, []).append(proj_info)
+        order_updates_item["active_projects"] += 1
+    return order_updates
+
+
+def best_of(func, repeats=3):
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def main(nr_orders):
+    data, orders = synthetic_data(nr_orders)
+    config_values = config.Config()
+    config_values.ORDER_PORTAL_URL = "https://orderportal.example.com"
+    config_values.ORDER_PORTAL_API_KEY = "x"
+    op = order_portal.OrderPortal(config_values, projects_data=types.SimpleNamespace(data=data))
+    op.all_orders = [op._project_order(order) for order in orders]
+
+    previous_time, previous_result = best_of(lambda: previous_process_orders(op))
+    current_time, current_result = best_of(op.process_orders)
+
+    for orderer, item in current_result.items():
+        assert item["recents"] == previous_result[orderer]["recents"]
+        assert item["active_projects"] == previous_result[orderer]["active_projects"]
+
+    print(f"{nr_orders} orders, {len(current_result)} orderers")
+    print(f"previous: {previous_time:.3f} s")
+    print(f"current:  {current_time:.3f} s ({previous_time / current_time:.1f}x)")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 50000)
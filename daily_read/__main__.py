@@ -2,21 +2,29 @@
 """The Daily Read, a utility to generate and upload automatic progress reports for NGI Sweden."""
 
 # Standard
-import datetime
 import logging
+import os
 import sys
 
 # Installed
 import click
 from dateutil.relativedelta import relativedelta
 import dotenv
+import git
+import requests
 from rich.logging import RichHandler
 
 # Own
+import daily_read.cassette
 import daily_read.config
 import daily_read.daily_report
+import daily_read.history
+import daily_read.journal
+import daily_read.maintenance
 import daily_read.ngi_data
 import daily_read.order_portal
+import daily_read.pipeline
+import daily_read.shards
 
 
 dotenv.load_dotenv()
@@ -48,48 +56,288 @@ def daily_read_cli():
 
 ### GENERATE ###
 @daily_read_cli.group()
-def generate():
+@click.option(
+    "--record",
+    type=click.Path(dir_okay=False),
+    help="Record all StatusDB and Order Portal traffic to this (gzipped) cassette file.",
+)
+@click.option(
+    "--replay",
+    type=click.Path(exists=True, dir_okay=False),
+    help="Run offline, answering StatusDB and Order Portal requests from a recorded cassette file.",
+)
+@click.pass_context
+def generate(ctx, record=None, replay=None):
     """Generate reports and save in a local git repository"""
-    pass
+    if record and replay:
+        raise click.UsageError("--record and --replay can not be used together")
+    if replay:
+        config_values.cassette = daily_read.cassette.Cassette(replay, replaying=True)
+    elif record:
+        config_values.cassette = daily_read.cassette.Cassette(record)
+        # Saved also when the command fails, to be able to reproduce the failure
+        ctx.call_on_close(config_values.cassette.save)
+
+
+def _parse_shard_option(ctx, param, value):
+    if value is None:
+        return None
+    try:
+        return daily_read.shards.parse_shard(value)
+    except ValueError as e:
+        raise click.BadParameter(str(e))
+
+
+def _shard_outcomes(projects_data):
+    outcomes_location = config_values.SHARD_OUTCOMES_LOCATION
+    if outcomes_location is None:
+        outcomes_location = os.path.join(projects_data.data_repo.git_dir, "daily_read_shards")
+    return daily_read.shards.ShardOutcomes(outcomes_location)
+
+
+def _run_journal(projects_data, shard):
+    journal_name = "daily_read_journal.json"
+    if shard is not None:
+        journal_name = "daily_read_journal_shard_{}_of_{}.json".format(*shard)
+    return daily_read.journal.RunJournal(os.path.join(projects_data.data_repo.git_dir, journal_name))
+
+
+def _daily_report(projects_data, compact=False):
+    cache_location = config_values.CACHE_LOCATION or projects_data.data_repo.git_dir
+    return daily_read.daily_report.DailyReport(
+        panel_cache_size=config_values.REPORT_PANEL_CACHE_SIZE,
+        compact=compact,
+        panel_cache_path=os.path.join(cache_location, "daily_read_panels.json.gz"),
+    )
+
+
+def _data_repo_maintenance(projects_data):
+    return daily_read.maintenance.DataRepoMaintenance(
+        projects_data.data_repo,
+        max_loose_objects=config_values.MAINTENANCE_MAX_LOOSE_OBJECTS,
+        max_packs=config_values.MAINTENANCE_MAX_PACKS,
+    )
+
+
+def _maintain_if_needed(projects_data):
+    maintenance = _data_repo_maintenance(projects_data)
+    reasons = maintenance.reasons_for_maintenance()
+    if reasons:
+        log.info(f"Running data repository maintenance: {', '.join(reasons)}")
+        maintenance.run(retention_days=config_values.MAINTENANCE_RETENTION_DAYS)
 
 
 @generate.command(name="all")
 @click.option("-u", "--upload", is_flag=True, help="Trigger upload of reports.")
 @click.option("--develop", is_flag=True, help="Only generate max 5 reports, for dev purposes.")
-def generate_all(upload=False, develop=False):
-    # Fetch data from all sources (configurable)
+@click.option(
+    "--shard",
+    callback=_parse_shard_option,
+    help=(
+        "Only handle orderers in shard i out of N, e.g. 2/4, using the data saved by 'generate prepare-shards'. "
+        "Merge outcomes afterwards with 'generate merge-shards'."
+    ),
+)
+@click.option(
+    "--resume",
+    is_flag=True,
+    help="Continue an interrupted run from its journal, using the saved data and skipping delivered orderers.",
+)
+@click.option("--compact", is_flag=True, help="Minify reports to reduce the bytes uploaded.")
+def generate_all(upload=False, develop=False, shard=None, resume=False, compact=False):
     projects_data = daily_read.ngi_data.ProjectDataMaster(config_values)
+    journal = _run_journal(projects_data, shard)
 
-    log.info(f"Fetching data for {projects_data.source_names}")
-    projects_data.get_data()
-    log.info("Data fetched successfully")
-    projects_data.save_data()
-    log.info("Data saved to disk")
+    if resume and journal.load() and journal.is_completed("data_saved"):
+        log.info(f"Resuming run started {journal.started}, reading saved data from disk")
+        projects_data.load_saved_data(journal.saved_files)
+    elif shard is not None:
+        if resume:
+            log.warning("No interrupted run found to resume, starting a new run")
+        # The shards share the data repository, the data is fetched and saved once for all of them
+        saved_files = _shard_outcomes(projects_data).read_saved_files()
+        if saved_files is None:
+            log.error("No saved data found for the shards, run 'generate prepare-shards' first")
+            sys.exit(1)
+        journal.start()
+        projects_data.load_saved_data(saved_files)
+        journal.record_saved_files(saved_files)
+        journal.stage_completed("data_saved")
+    else:
+        if resume:
+            log.warning("No interrupted run found to resume, starting a new run")
+        journal.start()
+
+        # Fetch data from all sources (configurable)
+        log.info(f"Fetching data for {projects_data.source_names}")
+        projects_data.get_data()
+        log.info("Data fetched successfully")
+        projects_data.save_data()
+        log.info("Data saved to disk")
+        journal.record_saved_files([project_record.relative_path for project_record in projects_data.data.values()])
+        journal.stage_completed("data_saved")
+
+    modified_by_orderer = projects_data.modified_projects_by_orderer()
+    if shard is None:
+        orderer_with_modified_projects = [orderer for orderer in modified_by_orderer if orderer]
+    else:
+        shard_index, nr_shards = shard
+        orderer_with_modified_projects = daily_read.shards.orderers_in_shard(
+            modified_by_orderer, shard_index, nr_shards
+        )
+        log.info(
+            f"Shard {shard_index}/{nr_shards} handles {len(orderer_with_modified_projects)} "
+            f"out of {len(modified_by_orderer)} orderer(s)"
+        )
+
+    delivered_orderers = journal.delivered_orderers()
+    if delivered_orderers:
+        log.info(f"Skipping {len(delivered_orderers)} orderer(s) already delivered in this run")
 
-    orderer_with_modified_projects = projects_data.find_unique_orderers()
+    orderers_to_handle = [orderer for orderer in orderer_with_modified_projects if orderer not in delivered_orderers]
+    if develop:
+        orderers_to_handle = orderers_to_handle[:5]
+    # Failed outcomes of an interrupted run are replaced by the outcomes of this attempt, an orderer that
+    # does not get a report this time (e.g. its orders are now filtered out) should not keep the run failing
+    journal.forget_orderers([orderer for orderer in journal.orderers if orderer not in delivered_orderers])
 
     op = daily_read.order_portal.OrderPortal(config_values, projects_data=projects_data)
-    nr_orderers = 0
-    for orderer in orderer_with_modified_projects:
-        if orderer:
-            op.get_orders(orderer=orderer)
-            nr_orderers += 1
-        if nr_orderers > 4 and develop:
-            break
-    modified_orders = op.process_orders()
-    daily_rep = daily_read.daily_report.DailyReport()
+    daily_rep = _daily_report(projects_data, compact=compact)
 
-    for owner in modified_orders:
+    # Each orderer flows through the stages below on its own, see daily_read.pipeline
+    def fetch_orders(orderer, _):
+        return [(orderer, op.fetch_orders(orderer=orderer))]
+
+    def process_orders(orderer, orders):
+        return list(op.process_orders(orders=orders).items())
+
+    def render_report(owner, owner_orders):
         if upload:
-            report = daily_rep.populate_and_write_report(owner, modified_orders[owner], STATUS_PRIORITY)
-            for project in modified_orders[owner]["projects"]:
-                op.upload_report_to_order_portal(report, project)
+            return [(owner, (owner_orders, daily_rep.populate_and_write_report(owner, owner_orders, STATUS_PRIORITY)))]
+        log.info("Saving report to disk instead of uploading")
+        daily_rep.populate_and_write_report(
+            owner, owner_orders, STATUS_PRIORITY, out_dir=config_values.REPORTS_LOCATION
+        )
+        return [(owner, None)]
+
+    def upload_report(owner, orders_and_report):
+        owner_orders, report = orders_and_report
+        uploaded = True
+        for projects in owner_orders["projects"].values():
+            for project in projects:
+                try:
+                    op.upload_report_to_order_portal(report, project)
+                except (AssertionError, requests.exceptions.RequestException) as e:
+                    log.error(f"Failed to upload report for {project.project_id} of {owner}: {e}")
+                    uploaded = False
+        return [(owner, uploaded)]
+
+    stages = [
+        daily_read.pipeline.Stage("Fetching orders", fetch_orders, nr_workers=config_values.ORDER_PORTAL_FETCH_WORKERS),
+        daily_read.pipeline.Stage("Processing orders", process_orders),
+        # The report cache is not thread safe, keep a single rendering worker
+        daily_read.pipeline.Stage("Rendering report", render_report),
+    ]
+    if upload:
+        stages.append(
+            daily_read.pipeline.Stage(
+                "Uploading report", upload_report, nr_workers=config_values.ORDER_PORTAL_UPLOAD_WORKERS
+            )
+        )
+
+    failed_orderers = []
+    pipeline = daily_read.pipeline.Pipeline(stages, queue_size=config_values.PIPELINE_QUEUE_SIZE)
+    for result in pipeline.run((orderer, None) for orderer in orderers_to_handle):
+        if isinstance(result, daily_read.pipeline.Failure):
+            owner, uploaded = result.key, False
+            failed_orderers.append(owner)
         else:
-            log.info("Saving report to disk instead of uploading")
-            report = daily_rep.populate_and_write_report(
-                owner, modified_orders[owner], STATUS_PRIORITY, out_dir=config_values.REPORTS_LOCATION
+            owner, uploaded = result
+        if upload:
+            journal.record_orderer(
+                owner, uploaded, [project.relative_path for project in modified_by_orderer.get(owner, [])]
             )
 
+    daily_rep.save_panel_cache()
+    log.info(
+        f"Run summary: {daily_rep.nr_reports} report(s) of {daily_rep.report_bytes} bytes rendered "
+        f"({daily_rep.panel_cache_hits} project panel(s) reused), "
+        f"{op.nr_uploads} upload(s) of {op.uploaded_bytes} bytes sent"
+    )
+    limiter_stats = op.limiter.stats()
+    log.info(
+        f"Order Portal: {limiter_stats['requests']} request(s) at {limiter_stats['requests_per_second']:.2f} requests/s, "
+        f"{limiter_stats['throttled']} throttled, final concurrency limit {limiter_stats['concurrency_limit']}"
+    )
+
+    if shard is not None and upload:
+        _shard_outcomes(projects_data).write(shard_index, nr_shards, journal.orderers)
+
+    if failed_orderers or not all(outcome["uploaded"] for outcome in journal.orderers.values()):
+        log.error("Reports failed for some orderers, rerun with --resume to retry them")
+        sys.exit(1)
+
+    journal.finish()
+    # Shards share the data repository, merge-shards runs the maintenance once they are all done
+    if shard is None:
+        _maintain_if_needed(projects_data)
+
+
+@generate.command(
+    name="prepare-shards", help="Fetch and save the data once for all shards, before starting 'generate all --shard'."
+)
+def generate_prepare_shards():
+    projects_data = daily_read.ngi_data.ProjectDataMaster(config_values)
+    shard_outcomes = _shard_outcomes(projects_data)
+    if shard_outcomes.read_all():
+        log.warning(f"Outcomes of a previous sharded run in {shard_outcomes.outcomes_location} are not merged yet")
+
+    log.info(f"Fetching data for {projects_data.source_names}")
+    projects_data.get_data()
+    log.info("Data fetched successfully")
+    projects_data.save_data()
+    shard_outcomes.write_saved_files([project_record.relative_path for project_record in projects_data.data.values()])
+    log.info("Data saved to disk for the shards to read")
+
+
+@generate.command(
+    name="merge-shards", help="Merge outcomes of sharded runs and commit data for successfully uploaded orderers."
+)
+@click.option("--allow-missing", is_flag=True, help="Merge even if not all shards have reported.")
+def generate_merge_shards(allow_missing=False):
+    projects_data = daily_read.ngi_data.ProjectDataMaster(config_values)
+    shard_outcomes = _shard_outcomes(projects_data)
+
+    outcomes = shard_outcomes.read_all()
+    if not outcomes:
+        log.error(f"No shard outcomes found in {shard_outcomes.outcomes_location}")
+        sys.exit(1)
+
+    try:
+        missing_shards = shard_outcomes.missing_shards(outcomes)
+    except ValueError as e:
+        log.error(str(e))
+        sys.exit(1)
+    if missing_shards and not allow_missing:
+        log.error(f"Shard(s) {', '.join(missing_shards)} have not reported, not merging")
+        sys.exit(1)
+
+    files_to_stage, uploaded_orderers, failed_orderers = shard_outcomes.merge(outcomes)
+    for orderer in failed_orderers:
+        log.warning(f"Upload failed for {orderer}, data is not committed and will be retried in the next run")
+
+    if files_to_stage:
+        projects_data.stage_files(files_to_stage)
+        projects_data.commit_staged_data(
+            f"Reports uploaded for {len(uploaded_orderers)} orderer(s) from {len(outcomes)} shard(s)"
+        )
+        log.info(f"Committed {len(files_to_stage)} data file(s) for {len(uploaded_orderers)} orderer(s)")
+    else:
+        log.info("No data files to commit")
+
+    shard_outcomes.clear(outcomes)
+    _maintain_if_needed(projects_data)
+
 
 @generate.command(
     name="single", help="Generate a report for a single project and save it locally. Mostly used for development"
@@ -111,7 +359,7 @@ def generate_single(project, include_older=False):
     # Fetch all projects so that the report will look the same
     log.info("Fetching data from NGI sources")
     if include_older:
-        close_date = (datetime.datetime.now() - relativedelta(months=120)).strftime("%Y-%m-%d")
+        close_date = (daily_read.cassette.now(config_values) - relativedelta(months=120)).strftime("%Y-%m-%d")
     else:
         close_date = None
 
@@ -133,11 +381,83 @@ def generate_single(project, include_older=False):
 
     op.get_orders(orderer=orderer)
     filtered_orders = op.process_orders()
-    daily_rep = daily_read.daily_report.DailyReport()
+    daily_rep = _daily_report(projects_data)
 
     for owner, owner_orders in filtered_orders.items():
         _ = daily_rep.populate_and_write_report(
             owner, owner_orders, STATUS_PRIORITY, out_dir=config_values.REPORTS_LOCATION
         )
+    daily_rep.save_panel_cache()
 
     log.info(f"Wrote report to {config_values.REPORTS_LOCATION}")
+
+
+### MAINTAIN ###
+@daily_read_cli.command(name="maintain", help="Repack, garbage collect and tune the data repository.")
+@click.option(
+    "--archive-days",
+    type=int,
+    default=None,
+    help="Move history older than this many days into a pack that is left alone by later repacks.",
+)
+@click.option("--fsmonitor", is_flag=True, help="Enable git's builtin file system monitor (macOS/Windows only).")
+def maintain(archive_days=None, fsmonitor=False):
+    projects_data = daily_read.ngi_data.ProjectDataMaster(config_values)
+    if archive_days is None:
+        archive_days = config_values.MAINTENANCE_RETENTION_DAYS
+    maintenance = _data_repo_maintenance(projects_data)
+    counts = maintenance.run(retention_days=archive_days, fsmonitor=fsmonitor)
+    click.echo(f"{counts['count']} loose objects, {counts['packs']} pack(s) of {counts['size-pack']} KiB")
+
+
+### CONFIG ###
+@daily_read_cli.group()
+def config():
+    """Inspect the configuration"""
+    pass
+
+
+@config.command(name="show", help="Print the effective configuration values and where they come from.")
+def config_show():
+    for attribute, value, source in config_values.effective_values():
+        click.echo(f"{attribute} = {value}  ({source})")
+
+
+### HISTORY ###
+@daily_read_cli.group()
+def history():
+    """Index and query the status history kept in the data repository"""
+    pass
+
+
+def _history_index():
+    data_repo = git.Repo(config_values.DATA_LOCATION)
+    cache_location = config_values.CACHE_LOCATION or data_repo.git_dir
+    index = daily_read.history.ProjectHistoryIndex(os.path.join(cache_location, "daily_read_history.json.gz"))
+    return data_repo, index
+
+
+@history.command(name="update", help="Add commits made since the last update to the history index.")
+def history_update():
+    data_repo, index = _history_index()
+    nr_commits = index.update(data_repo)
+    index.save()
+    log.info(f"Indexed {nr_commits} new commit(s), the index has {len(index)} status entries")
+
+
+@history.command(name="turnaround", help="Show turnaround times per node between two statuses.")
+@click.option("--from-status", default="Samples Received", show_default=True)
+@click.option("--to-status", default="All Raw data Delivered", show_default=True)
+def history_turnaround(from_status, to_status):
+    _, index = _history_index()
+    for node, (nr_projects, median_days, max_days) in sorted(index.turnaround_summary(from_status, to_status).items()):
+        click.echo(f"{node}\t{nr_projects} project(s)\tmedian {median_days} days\tmax {max_days} days")
+
+
+@history.command(name="stuck", help="List projects that have had the same latest status for a long time.")
+@click.option("-s", "--status", default="Library QC finished", show_default=True)
+@click.option("-d", "--days", default=30, show_default=True, help="Minimum number of days with the status.")
+def history_stuck(status, days):
+    _, index = _history_index()
+    for project, date in index.stuck_in(status, days):
+        click.echo(f"{project}\t{status} since {date}")
@@ -0,0 +1,183 @@
+"""Module to record StatusDB and Order Portal traffic to a file and replay it offline"""
+
+# Standard
+import base64
+import datetime
+import gzip
+import json
+import logging
+import os
+import threading
+from urllib.parse import urlencode, urlsplit
+
+# installed
+import couchdb.client
+import requests
+
+# Own
+from daily_read import statusdb
+
+log = logging.getLogger(__name__)
+
+
+class Cassette(object):
+    """Class to keep recorded StatusDB rows and Order Portal responses, saved as gzipped json
+
+    Interactions are stored per request key in the order they were made. When
+    replaying, each request gets the next unused recorded answer for its key,
+    so a request made several times is answered in the same order as recorded.
+
+    The time of the recording is stored as well and used as the current time of
+    the run (see now), so that dates computed from it, e.g. the StatusDB close
+    date, are the same when the cassette is replayed on a later day.
+    """
+
+    def __init__(self, cassette_path, replaying=False):
+        self.cassette_path = cassette_path
+        self.replaying = replaying
+        self.reference_time = datetime.datetime.now()
+        self.interactions = {}
+        self.lock = threading.Lock()
+        self._next = {}
+
+        if replaying:
+            if not os.path.exists(cassette_path):
+                raise ValueError(f"Cassette to replay not found: {cassette_path}")
+            with gzip.open(cassette_path, "rt") as fh:
+                recorded = json.load(fh)
+            self.reference_time = datetime.datetime.fromisoformat(recorded["reference_time"])
+            self.interactions = recorded["interactions"]
+            log.info(
+                f"Replaying {sum(len(i) for i in self.interactions.values())} interaction(s) "
+                f"recorded {self.reference_time} from {cassette_path}"
+            )
+
+    def record(self, key, answer):
+        with self.lock:
+            self.interactions.setdefault(key, []).append(answer)
+
+    def replay(self, key):
+        """Returns the next recorded answer for key, raises KeyError if there is none left"""
+        with self.lock:
+            answers = self.interactions.get(key, [])
+            index = self._next.get(key, 0)
+            if index >= len(answers):
+                raise KeyError(key)
+            self._next[key] = index + 1
+            return answers[index]
+
+    def save(self):
+        tmp_cassette_path = f"{self.cassette_path}.tmp"
+        with self.lock:
+            with gzip.open(tmp_cassette_path, "wt") as fh:
+                json.dump({"reference_time": self.reference_time.isoformat(), "interactions": self.interactions}, fh)
+        os.replace(tmp_cassette_path, self.cassette_path)
+        log.info(f"Recorded {sum(len(i) for i in self.interactions.values())} interaction(s) to {self.cassette_path}")
+
+
+def now(config):
+    """Returns the current time of the run, the time of the recording if a cassette is used"""
+    if config.cassette is None:
+        return datetime.datetime.now()
+    return config.cassette.reference_time
+
+
+def statusdb_session(config):
+    """Returns a StatusDBSession, recording or replaying its rows if config.cassette is set"""
+    if config.cassette is None:
+        return statusdb.StatusDBSession(config)
+    if config.cassette.replaying:
+        return ReplayedStatusDBSession(config.cassette)
+    return RecordingStatusDBSession(statusdb.StatusDBSession(config), config.cassette)
+
+
+class RecordingStatusDBSession(object):
+    def __init__(self, session, cassette):
+        self.session = session
+        self.cassette = cassette
+
+    def rows(self, close_date=None):
+        rows = list(self.session.rows(close_date=close_date))
+        self.cassette.record(
+            f"statusdb rows {close_date}", [{"id": row.id, "key": row.key, "value": row.value} for row in rows]
+        )
+        return rows
+
+
+class ReplayedStatusDBSession(object):
+    """Stands in for a StatusDBSession without connecting to StatusDB"""
+
+    def __init__(self, cassette):
+        self.cassette = cassette
+
+    def rows(self, close_date=None):
+        try:
+            rows = self.cassette.replay(f"statusdb rows {close_date}")
+        except KeyError:
+            raise ValueError(f"No StatusDB rows recorded for close date {close_date}")
+        return [couchdb.client.Row(row) for row in rows]
+
+
+def _request_key(method, url, params=None):
+    """Key for a request, leaving out the host and headers (with the api key)"""
+    path = urlsplit(url).path.lstrip("/")
+    if params:
+        path = f"{path}?{urlencode(sorted(params.items()))}"
+    return f"{method} {path}"
+
+
+class RecordingSession(requests.Session):
+    """requests.Session that records all responses to the cassette"""
+
+    def __init__(self, cassette):
+        super().__init__()
+        self.cassette = cassette
+
+    def request(self, method, url, params=None, **kwargs):
+        response = super().request(method, url, params=params, **kwargs)
+        # Reads the whole content, streamed responses are then iterated from memory
+        content = response.content
+        self.cassette.record(
+            _request_key(method, url, params),
+            {
+                "status_code": response.status_code,
+                "reason": response.reason,
+                "headers": dict(response.headers),
+                "encoding": response.encoding,
+                "content": base64.b64encode(content).decode("ascii"),
+            },
+        )
+        return response
+
+
+class ReplaySession(requests.Session):
+    """requests.Session that answers from the cassette instead of the network"""
+
+    def __init__(self, cassette):
+        super().__init__()
+        self.cassette = cassette
+
+    def request(self, method, url, params=None, **kwargs):
+        try:
+            recorded = self.cassette.replay(_request_key(method, url, params))
+        except KeyError:
+            raise requests.exceptions.ConnectionError(f"No response recorded for {_request_key(method, url, params)}")
+
+        response = requests.Response()
+        response.status_code = recorded["status_code"]
+        response.reason = recorded["reason"]
+        response.headers = requests.structures.CaseInsensitiveDict(recorded["headers"])
+        response.encoding = recorded["encoding"]
+        response.url = url
+        response._content = base64.b64decode(recorded["content"])
+        response._content_consumed = True
+        return response
+
+
+def order_portal_session(cassette):
+    """Returns the requests.Session to use for the Order Portal"""
+    if cassette is None:
+        return requests.Session()
+    if cassette.replaying:
+        return ReplaySession(cassette)
+    return RecordingSession(cassette)
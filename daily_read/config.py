@@ -1,6 +1,70 @@
 import os
 import yaml
 
+# Performance settings with their defaults, grouped as in the yaml config file, e.g.:
+#
+#   order_portal:
+#     timeout: 30
+#
+# Each setting becomes an attribute on Config (ORDER_PORTAL_TIMEOUT) and can be
+# overridden by an environment variable with the DAILY_READ_ prefix
+# (DAILY_READ_ORDER_PORTAL_TIMEOUT). Values have to be positive, a value of 0 is
+# only allowed for the settings in ZERO_ALLOWED. On/off settings take
+# true/false, yes/no, on/off or 1/0.
+PERFORMANCE_DEFAULTS = {
+    "order_portal": {
+        "timeout": 60.0,
+        "pool_size": 16,
+        "initial_concurrency": 2,
+        "max_concurrency": 16,
+        "target_latency": 2.0,
+        "requests_per_second": 10.0,
+        "burst": 10,
+        "max_retries": 5,
+        "stream_chunk_size": 65536,
+        "fetch_workers": 4,
+        "upload_workers": 8,
+        # Only if the order portal accepts Content-Encoding: gzip
+        "gzip_uploads": False,
+    },
+    "statusdb": {
+        "timeout": 60.0,
+        "page_size": 0,
+        "partition_days": 365,
+        "partition_workers": 4,
+    },
+    "data": {
+        "writer_workers": 8,
+    },
+    "report": {
+        "panel_cache_size": 2048,
+    },
+    "pipeline": {
+        "queue_size": 8,
+    },
+    "cache": {
+        "location": None,
+    },
+    "maintenance": {
+        "max_loose_objects": 5000,
+        "max_packs": 20,
+        "retention_days": 0,
+    },
+}
+
+# Settings where 0 is a valid value, meaning off (or no retries)
+ZERO_ALLOWED = [
+    "order_portal.max_retries",
+    "statusdb.page_size",
+    "statusdb.partition_days",
+    "maintenance.retention_days",
+]
+
+TRUE_VALUES = ("true", "yes", "on", "1")
+FALSE_VALUES = ("false", "no", "off", "0", "")
+
+SECRET_ATTRIBUTES = ["ORDER_PORTAL_API_KEY", "STHLM_STATUSDB_PASSWORD"]
+
 
 class Config(object):
     def __init__(self):
@@ -8,6 +72,7 @@ class Config(object):
         self.ORDER_PORTAL_API_KEY = os.getenv("DAILY_READ_ORDER_PORTAL_API_KEY")
         self.REPORTS_LOCATION = os.getenv("DAILY_READ_REPORTS_LOCATION")
         self.DATA_LOCATION = os.getenv("DAILY_READ_DATA_LOCATION")
+        self.SHARD_OUTCOMES_LOCATION = os.getenv("DAILY_READ_SHARD_OUTCOMES_LOCATION")
         self.STHLM_STATUSDB_URL = os.getenv("DAILY_READ_STHLM_STATUSDB_URL")
         self.STHLM_STATUSDB_USERNAME = os.getenv("DAILY_READ_STHLM_STATUSDB_USERNAME")
         self.STHLM_STATUSDB_PASSWORD = os.getenv("DAILY_READ_STHLM_STATUSDB_PASSWORD")
@@ -15,3 +80,75 @@ class Config(object):
         self.FETCH_FROM_NGIS = os.getenv("DAILY_READ_FETCH_FROM_NGIS")
         self.FETCH_FROM_SNPSEQ = os.getenv("DAILY_READ_FETCH_FROM_SNPSEQ")
         self.FETCH_FROM_UGC = os.getenv("DAILY_READ_FETCH_FROM_UGC")
+        self.UGC_EXPORTS_LOCATION = os.getenv("DAILY_READ_UGC_EXPORTS_LOCATION")
+
+        self.CONFIG_FILE = os.getenv("DAILY_READ_CONFIG_FILE")
+        # Where each performance setting got its value from: default, config file or environment
+        self.sources = {}
+        self._load_performance_settings()
+
+        # Set to a daily_read.cassette.Cassette to record or replay StatusDB and Order Portal traffic
+        self.cassette = None
+
+    def _load_performance_settings(self):
+        """Sets performance settings from defaults, the yaml config file and environment variables
+
+        Raises ValueError for unknown or invalid settings.
+        """
+        file_values = {}
+        if self.CONFIG_FILE:
+            with open(self.CONFIG_FILE, "r") as fh:
+                file_values = yaml.safe_load(fh) or {}
+            for section, values in file_values.items():
+                if section not in PERFORMANCE_DEFAULTS:
+                    raise ValueError(f"Unknown section in {self.CONFIG_FILE}: {section}")
+                for key in values or {}:
+                    if key not in PERFORMANCE_DEFAULTS[section]:
+                        raise ValueError(f"Unknown setting in {self.CONFIG_FILE}: {section}.{key}")
+
+        for section, defaults in PERFORMANCE_DEFAULTS.items():
+            for key, default in defaults.items():
+                attribute = f"{section}_{key}".upper()
+                value, source = default, "default"
+                if key in (file_values.get(section) or {}):
+                    value, source = file_values[section][key], self.CONFIG_FILE
+                env_value = os.getenv(f"DAILY_READ_{attribute}")
+                if env_value is not None:
+                    value, source = env_value, f"DAILY_READ_{attribute}"
+
+                zero_allowed = f"{section}.{key}" in ZERO_ALLOWED
+                setattr(self, attribute, self._validated(attribute, value, default, source, zero_allowed))
+                self.sources[attribute] = source
+
+    def _validated(self, attribute, value, default, source, zero_allowed=False):
+        if default is None:
+            # Paths and other free text settings
+            return None if value in (None, "") else str(value)
+
+        if isinstance(default, bool):
+            if isinstance(value, bool):
+                return value
+            if str(value).strip().lower() in TRUE_VALUES:
+                return True
+            if str(value).strip().lower() in FALSE_VALUES:
+                return False
+            raise ValueError(f"{attribute} from {source} should be true or false, got: {value!r}")
+
+        try:
+            value = type(default)(value)
+        except (TypeError, ValueError):
+            raise ValueError(f"{attribute} from {source} should be a {type(default).__name__}, got: {value!r}")
+        if value < 0 or (value == 0 and not zero_allowed):
+            raise ValueError(f"{attribute} from {source} should be positive, got: {value}")
+        return value
+
+    def effective_values(self):
+        """Returns a list of (attribute, value, source) for all settings, with secrets masked"""
+        values = []
+        for attribute, value in vars(self).items():
+            if not attribute.isupper():
+                continue
+            if attribute in SECRET_ATTRIBUTES and value:
+                value = "*********"
+            values.append((attribute, value, self.sources.get(attribute, "environment")))
+        return values
@@ -1,28 +1,124 @@
 """Module to generate daily reports"""
 
 # Standard
-import datetime
+import collections
+import gzip
+import hashlib
+import json
 import logging
 import os
+import re
+import tempfile
 
 # installed
 import jinja2
 
 log = logging.getLogger(__name__)
 
+# Content of elements where whitespace is significant and should be left as is
+_PRESERVED_CONTENT_RE = re.compile(r"<(pre|textarea|script)\b[^>]*>(.*?)</\1\s*>", re.DOTALL | re.IGNORECASE)
+# Comments, except conditional comments which older browsers act on
+_COMMENT_RE = re.compile(r"<!--(?!\[if).*?-->", re.DOTALL)
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def _minify_text(html):
+    return _WHITESPACE_RE.sub(" ", _COMMENT_RE.sub("", html))
+
+
+def minify_html(html):
+    """Removes comments and collapses whitespace, which browsers render the same way"""
+    minified = []
+    pos = 0
+    for match in _PRESERVED_CONTENT_RE.finditer(html):
+        minified.append(_minify_text(html[pos : match.start(2)]))
+        minified.append(match.group(2))
+        pos = match.end(2)
+    minified.append(_minify_text(html[pos:]))
+    return "".join(minified).strip()
+
 
 class DailyReport(object):
     """Class to handle daily report generation"""
 
-    def __init__(self):
+    def __init__(self, panel_cache_size=2048, compact=False, panel_cache_path=None):
         self.jinja_env = jinja2.Environment(loader=jinja2.FileSystemLoader("./daily_read/templates"))
         self.template = self.jinja_env.get_template("daily_report.html.j2")
+        self.project_template = self.jinja_env.get_template("project_panel.html.j2")
+        # Part of the panel keys, so that panels rendered with an older template are not reused
+        template_source = self.jinja_env.loader.get_source(self.jinja_env, "project_panel.html.j2")[0]
+        self._template_hash = hashlib.sha1(template_source.encode("utf-8")).hexdigest()
+
+        # Rendered project panels, key: hash of template and project data, least recently used first.
+        # Kept between runs in panel_cache_path (gzipped json), if given, as most projects do not change
+        self.panel_cache_size = panel_cache_size
+        self.panel_cache_path = panel_cache_path
+        self._panel_cache = collections.OrderedDict()
+        if panel_cache_path is not None and os.path.exists(panel_cache_path):
+            with gzip.open(panel_cache_path, "rt") as fh:
+                self._panel_cache.update(json.load(fh))
+            while len(self._panel_cache) > self.panel_cache_size:
+                self._panel_cache.popitem(last=False)
+        self.panel_cache_hits = 0
+        self.panel_cache_misses = 0
+
+        # Minify reports to reduce the bytes uploaded
+        self.compact = compact
+        self.nr_reports = 0
+        self.report_bytes = 0
+
+    def _panel_key(self, project):
+        """Returns a hash of the project data shown in its panel"""
+        panel_data = [self._template_hash, project.project_id, project.internal_name, project.project_dates]
+        return hashlib.sha1(json.dumps(panel_data, sort_keys=True).encode("utf-8")).hexdigest()
+
+    def render_project_panel(self, project):
+        """Returns the rendered panel for a project, reusing it if the project data is unchanged"""
+        key = self._panel_key(project)
+        if key in self._panel_cache:
+            self.panel_cache_hits += 1
+            self._panel_cache.move_to_end(key)
+            return self._panel_cache[key]
+
+        self.panel_cache_misses += 1
+        panel = self.project_template.render(project=project)
+        self._panel_cache[key] = panel
+        if len(self._panel_cache) > self.panel_cache_size:
+            self._panel_cache.popitem(last=False)
+        return panel
+
+    def save_panel_cache(self):
+        """Saves the panel cache to panel_cache_path, if any panels were rendered"""
+        if self.panel_cache_path is None or not self.panel_cache_misses:
+            return
+        # A temporary file of its own, as shards running at the same time may share the cache
+        fd, tmp_cache_path = tempfile.mkstemp(dir=os.path.dirname(self.panel_cache_path), suffix=".tmp")
+        os.close(fd)
+        try:
+            with gzip.open(tmp_cache_path, "wt") as fh:
+                # A list of pairs keeps the least recently used order
+                json.dump(list(self._panel_cache.items()), fh)
+            os.replace(tmp_cache_path, self.panel_cache_path)
+        except BaseException:
+            os.remove(tmp_cache_path)
+            raise
 
     def populate_and_write_report(self, pi_email, data, priority, out_dir=None):
         """Populate report with values"""
-        pull_date = f"{datetime.datetime.strptime(data['pull_date'], '%Y-%m-%d %H:%M:%S.%f').date()}"
+        # pull_date is given as str(datetime), the date is the leading YYYY-MM-DD part
+        pull_date = data["pull_date"][:10]
         data["pull_date"] = pull_date
-        filled_report = self.template.render(pi_email=pi_email, data=data, priority=priority)
+        project_panels = {}
+        for projects in data["projects"].values():
+            for project in projects:
+                project_panels[project.project_id] = self.render_project_panel(project)
+        filled_report = self.template.render(
+            pi_email=pi_email, data=data, priority=priority, project_panels=project_panels
+        )
+        if self.compact:
+            filled_report = minify_html(filled_report)
+        self.nr_reports += 1
+        self.report_bytes += len(filled_report.encode("utf-8"))
 
         if out_dir:
             file_name = os.path.join(out_dir, f"{pi_email.split('@')[0]}_{pull_date}.html")
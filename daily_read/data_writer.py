@@ -0,0 +1,116 @@
+"""Module to write project data files to the data location"""
+
+# Standard
+import concurrent.futures
+import json
+import logging
+import os
+import tempfile
+
+log = logging.getLogger(__name__)
+
+
+class ProjectFileWriter(object):
+    """Class to write ProjectDataRecords to json files, in parallel and crash safe
+
+    Each file is first written to a temporary file in tmp_dir and then renamed
+    into place, so that a file is either the old or the new version, never half
+    written. tmp_dir should be on the same file system as the data location but
+    outside the working tree, e.g. inside .git, so that left over temporary
+    files are never taken for project files. Files whose content is unchanged
+    are not rewritten, which also keeps git from having to rehash them.
+    """
+
+    def __init__(self, data_location, tmp_dir, max_workers=8):
+        self.data_location = data_location
+        self.tmp_dir = tmp_dir
+        self.max_workers = max_workers
+        self._created_dirs = set()
+
+    def _ensure_dir(self, relative_dirpath):
+        if relative_dirpath in self._created_dirs:
+            return
+        abs_dirpath = os.path.join(self.data_location, relative_dirpath)
+        os.makedirs(abs_dirpath, exist_ok=True)
+        if not os.path.isdir(abs_dirpath):
+            raise ValueError(
+                f"Failed to use data directory {abs_dirpath} for download, path exists but is not a directory."
+            )
+        self._created_dirs.add(relative_dirpath)
+
+    def _write_if_changed(self, relative_path, content):
+        """Writes content to a temporary file, returns its path or None if the file is unchanged"""
+        abs_path = os.path.join(self.data_location, relative_path)
+        try:
+            with open(abs_path, mode="r") as fh:
+                if fh.read() == content:
+                    return None
+        except FileNotFoundError:
+            pass
+
+        # A unique name, other processes (e.g. shards) may write the same file to the same tmp_dir
+        fd, tmp_path = tempfile.mkstemp(dir=self.tmp_dir, prefix=f"{os.path.basename(relative_path)}.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, mode="w") as fh:
+                fh.write(content)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+        return tmp_path
+
+    def _remove_tmp_files(self, tmp_paths):
+        for tmp_path in tmp_paths:
+            try:
+                os.remove(tmp_path)
+            except FileNotFoundError:
+                pass
+
+    def _fsync(self, path):
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def write(self, project_records):
+        """Writes all project records, returns the number of files written"""
+        # Serialize everything up front, the threads only do file IO
+        payloads = []
+        for project_record in project_records:
+            self._ensure_dir(project_record.relative_dirpath)
+            if os.path.dirname(project_record.relative_path) != project_record.relative_dirpath:
+                # This should really never happen
+                raise ValueError(
+                    f"Error with paths, dirname of {project_record.relative_path} should be {project_record.relative_dirpath}"
+                )
+            payloads.append((project_record.relative_path, json.dumps(project_record.data_for_file())))
+
+        os.makedirs(self.tmp_dir, exist_ok=True)
+        to_replace = []
+        try:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                futures = [executor.submit(self._write_if_changed, *payload) for payload in payloads]
+                concurrent.futures.wait(futures)
+                for future, (relative_path, _) in zip(futures, payloads):
+                    # Collect all written files before raising, so that none of them is left behind
+                    if not future.exception() and future.result():
+                        to_replace.append((future.result(), os.path.join(self.data_location, relative_path)))
+                for future in futures:
+                    future.result()
+
+                # One batch of fsyncs for all new content before any file is replaced
+                list(executor.map(self._fsync, [tmp_path for tmp_path, _ in to_replace]))
+
+            for tmp_path, abs_path in to_replace:
+                log.debug(f"Writing data to {abs_path}")
+                os.replace(tmp_path, abs_path)
+        except BaseException:
+            self._remove_tmp_files([tmp_path for tmp_path, _ in to_replace])
+            raise
+
+        # Make the renames durable
+        for abs_dirpath in {os.path.dirname(abs_path) for _, abs_path in to_replace}:
+            self._fsync(abs_dirpath)
+
+        log.info(f"Wrote {len(to_replace)} project file(s), {len(payloads) - len(to_replace)} unchanged")
+        return len(to_replace)
@@ -0,0 +1,151 @@
+"""Module to index and query the status history of projects kept in the data repository"""
+
+# Standard
+import datetime
+import gzip
+import json
+import logging
+import os
+import statistics
+
+# Own
+from daily_read.ngi_data import ProjectDataRecord
+
+log = logging.getLogger(__name__)
+
+COLUMNS = ["project", "node", "status", "date", "commit_time"]
+
+
+class ProjectHistoryIndex(object):
+    """Class to keep a columnar index of when project statuses appeared in the data repository
+
+    Every (project, status, date) combination is stored once, together with the
+    time of the first commit where it was found. The index remembers the last
+    indexed commit so that an update only has to read the commits made since.
+    """
+
+    def __init__(self, index_path):
+        self.index_path = index_path
+        self.last_commit = None
+        self.columns = {column: [] for column in COLUMNS}
+        self._seen = set()
+
+        if os.path.exists(self.index_path):
+            with gzip.open(self.index_path, "rt") as fh:
+                stored = json.load(fh)
+            self.last_commit = stored["last_commit"]
+            self.columns = stored["columns"]
+            self._seen = set(zip(self.columns["project"], self.columns["status"], self.columns["date"]))
+
+    def __len__(self):
+        return len(self.columns["project"])
+
+    def save(self):
+        tmp_index_path = f"{self.index_path}.tmp"
+        with gzip.open(tmp_index_path, "wt") as fh:
+            json.dump({"last_commit": self.last_commit, "columns": self.columns}, fh)
+        os.replace(tmp_index_path, self.index_path)
+
+    def _add_file(self, path, content, commit_time):
+        try:
+            project_dates = json.loads(content)["project_dates"]
+        except (ValueError, KeyError):
+            log.debug(f"Skipping {path}, not a project data file")
+            return
+
+        project_id = ProjectDataRecord.portal_id_from_path(path)
+        node = path.split("/")[0]
+        for date, statuses in project_dates.items():
+            for status in statuses:
+                if (project_id, status, date) in self._seen:
+                    continue
+                self._seen.add((project_id, status, date))
+                for column, value in zip(COLUMNS, [project_id, node, status, date, commit_time]):
+                    self.columns[column].append(value)
+
+    def update(self, data_repo):
+        """Indexes commits made since the last update, returns the number of new commits"""
+        head = data_repo.head.commit
+        if head.hexsha == self.last_commit:
+            return 0
+
+        rev = head.hexsha if self.last_commit is None else f"{self.last_commit}..{head.hexsha}"
+        nr_commits = 0
+        for commit in data_repo.iter_commits(rev, reverse=True):
+            commit_time = commit.committed_datetime.isoformat()
+            if commit.parents:
+                for diff in commit.parents[0].diff(commit):
+                    if diff.b_blob is not None and diff.b_path.endswith(".json"):
+                        self._add_file(diff.b_path, diff.b_blob.data_stream.read(), commit_time)
+            else:
+                for blob in commit.tree.traverse():
+                    if blob.type == "blob" and blob.path.endswith(".json"):
+                        self._add_file(blob.path, blob.data_stream.read(), commit_time)
+            nr_commits += 1
+
+        self.last_commit = head.hexsha
+        return nr_commits
+
+    def status_dates(self, status, node=None):
+        """Returns a dict with project as key and the earliest date it got the given status"""
+        dates = {}
+        columns = zip(self.columns["project"], self.columns["node"], self.columns["status"], self.columns["date"])
+        for row_project, row_node, row_status, row_date in columns:
+            if row_status != status or (node is not None and row_node != node):
+                continue
+            if row_project not in dates or row_date < dates[row_project]:
+                dates[row_project] = row_date
+        return dates
+
+    def turnaround_times(self, from_status, to_status, node=None):
+        """Returns a dict with project as key and the number of days from from_status to to_status"""
+        from_dates = self.status_dates(from_status, node=node)
+        to_dates = self.status_dates(to_status, node=node)
+        turnaround = {}
+        for project, from_date in from_dates.items():
+            if project not in to_dates:
+                continue
+            try:
+                days = datetime.date.fromisoformat(to_dates[project]) - datetime.date.fromisoformat(from_date)
+            except ValueError:
+                log.debug(f"Skipping {project}, dates are not valid: {from_date}, {to_dates[project]}")
+                continue
+            turnaround[project] = days.days
+        return turnaround
+
+    def turnaround_summary(self, from_status, to_status):
+        """Returns a dict with node as key and (nr projects, median days, max days) as value"""
+        days_by_node = {}
+        for node in set(self.columns["node"]):
+            days = list(self.turnaround_times(from_status, to_status, node=node).values())
+            if days:
+                days_by_node[node] = (len(days), statistics.median(days), max(days))
+        return days_by_node
+
+    def current_statuses(self):
+        """Returns a dict with project as key and (status, date) of its latest status as value
+
+        The status is chosen as in ProjectDataRecord, so that it is the same as shown in the reports.
+        """
+        latest = {}  # Key: project, Value: (latest date, statuses of that date)
+        for project, status, date in zip(self.columns["project"], self.columns["status"], self.columns["date"]):
+            latest_date, statuses = latest.get(project, (None, None))
+            if latest_date is None or date > latest_date:
+                latest[project] = (date, [status])
+            elif date == latest_date:
+                statuses.append(status)
+        return {
+            project: (ProjectDataRecord.status_of_date(statuses), date) for project, (date, statuses) in latest.items()
+        }
+
+    def stuck_in(self, status, older_than_days, today=None):
+        """Returns projects, oldest first, that have had status as their latest status for more than older_than_days"""
+        if today is None:
+            today = datetime.date.today()
+        cutoff = (today - datetime.timedelta(days=older_than_days)).isoformat()
+        stuck = [
+            (date, project)
+            for project, (current_status, date) in self.current_statuses().items()
+            if current_status == status and date < cutoff
+        ]
+        return [(project, date) for date, project in sorted(stuck)]
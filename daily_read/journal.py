@@ -0,0 +1,93 @@
+"""Module to keep a journal of a run so that an interrupted run can be resumed"""
+
+# Standard
+import datetime
+import json
+import logging
+import os
+
+log = logging.getLogger(__name__)
+
+
+class RunJournal(object):
+    """Class to record completed stages and per-orderer upload outcomes of a run
+
+    The journal is rewritten (atomically) after every recorded step and
+    removed when the run finishes, so an existing journal always describes
+    an unfinished run.
+    """
+
+    def __init__(self, journal_path):
+        self.journal_path = journal_path
+        self.entries = None
+
+    @property
+    def started(self):
+        return self.entries["started"]
+
+    @property
+    def saved_files(self):
+        return self.entries["saved_files"]
+
+    @property
+    def orderers(self):
+        """Dict with orderer as key and value {"uploaded": bool, "files": [relative paths]}"""
+        return self.entries["orderers"]
+
+    def load(self):
+        """Loads the journal of an unfinished run, returns False if there is none"""
+        if not os.path.exists(self.journal_path):
+            return False
+
+        with open(self.journal_path, "r") as fh:
+            self.entries = json.load(fh)
+        return True
+
+    def start(self):
+        """Starts a new journal, replacing any previous one"""
+        self.entries = {
+            "started": f"{datetime.datetime.now()}",
+            "stages": {},
+            "saved_files": [],
+            "orderers": {},
+        }
+        self._write()
+
+    def stage_completed(self, stage):
+        self.entries["stages"][stage] = f"{datetime.datetime.now()}"
+        self._write()
+
+    def is_completed(self, stage):
+        return stage in self.entries["stages"]
+
+    def record_saved_files(self, relative_paths):
+        self.entries["saved_files"] = sorted(relative_paths)
+        self._write()
+
+    def record_orderer(self, orderer, uploaded, files):
+        self.entries["orderers"][orderer] = {"uploaded": uploaded, "files": files}
+        self._write()
+
+    def forget_orderers(self, orderers):
+        """Removes the outcomes of orderers that are about to be handled again"""
+        for orderer in orderers:
+            self.entries["orderers"].pop(orderer, None)
+        self._write()
+
+    def delivered_orderers(self):
+        """Returns orderers whose reports have already been uploaded"""
+        return {orderer for orderer, outcome in self.orderers.items() if outcome["uploaded"]}
+
+    def finish(self):
+        """Removes the journal, the run is complete and should not be resumed"""
+        if os.path.exists(self.journal_path):
+            os.remove(self.journal_path)
+        self.entries = None
+
+    def _write(self):
+        os.makedirs(os.path.dirname(self.journal_path), exist_ok=True)
+        tmp_journal_path = f"{self.journal_path}.tmp"
+        with open(tmp_journal_path, mode="w") as fh:
+            json.dump(self.entries, fh)
+        os.replace(tmp_journal_path, self.journal_path)
+        log.debug(f"Updated run journal {self.journal_path}")
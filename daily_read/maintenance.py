@@ -0,0 +1,131 @@
+"""Module to keep git operations on the data repository fast as it grows"""
+
+# Standard
+import datetime
+import logging
+import os
+import subprocess
+import sys
+
+log = logging.getLogger(__name__)
+
+# Settings that keep "git status" (is_dirty, untracked files) from scanning more
+# than needed and speed up history walks, see git-config(1). Index version 4 and
+# split index would help as well but GitPython cannot read those indexes.
+INDEX_SETTINGS = {
+    "core.untrackedCache": "true",
+    "core.commitGraph": "true",
+    "gc.writeCommitGraph": "true",
+}
+
+
+class DataRepoMaintenance(object):
+    """Class to repack, garbage collect and tune the data repository
+
+    Every run adds a commit and loose objects for all changed project files,
+    maintenance packs them so that object lookups stay fast.
+    """
+
+    def __init__(self, data_repo, max_loose_objects=5000, max_packs=20):
+        self.data_repo = data_repo
+        self.max_loose_objects = max_loose_objects
+        self.max_packs = max_packs
+        self.archived_marker = os.path.join(data_repo.git_dir, "daily_read_archived")
+
+    def _git(self, *args, stdin=None):
+        return subprocess.run(
+            ["git", *args],
+            cwd=self.data_repo.working_dir,
+            input=stdin,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout
+
+    def object_counts(self):
+        """Returns a dict with the output of git count-objects -v, e.g. {"count": 12, "packs": 1, ...}"""
+        counts = {}
+        for line in self._git("count-objects", "-v").splitlines():
+            key, value = line.split(":", 1)
+            counts[key.strip()] = int(value)
+        return counts
+
+    def reasons_for_maintenance(self):
+        """Returns a list of reasons why maintenance is needed, empty if it is not"""
+        counts = self.object_counts()
+        reasons = []
+        if counts["count"] > self.max_loose_objects:
+            reasons.append(f"{counts['count']} loose objects (max {self.max_loose_objects})")
+        if counts["packs"] > self.max_packs:
+            reasons.append(f"{counts['packs']} packs (max {self.max_packs})")
+        config_reader = self.data_repo.config_reader()
+        for key, value in INDEX_SETTINGS.items():
+            section, option = key.rsplit(".", 1)
+            if str(config_reader.get_value(section, option, default="")).lower() != value:
+                reasons.append(f"{key} is not set to {value}")
+                break
+        return reasons
+
+    def optimize_index(self, fsmonitor=False):
+        """Enables the index and status optimizations, fsmonitor needs git's builtin daemon (macOS/Windows)"""
+        settings = dict(INDEX_SETTINGS)
+        if fsmonitor:
+            if sys.platform not in ("darwin", "win32"):
+                log.warning(f"The builtin fsmonitor is not available on {sys.platform}, not enabling it")
+            else:
+                settings["core.fsmonitor"] = "true"
+
+        with self.data_repo.config_writer() as writer:
+            for key, value in settings.items():
+                section, option = key.rsplit(".", 1)
+                writer.set_value(section, option, value)
+        self._git("update-index", "--untracked-cache")
+
+    def archive_history(self, retention_days):
+        """Moves objects of commits older than retention_days into a separate pack that later repacks leave alone
+
+        Returns the name of the new pack or None if there was nothing new to archive.
+        """
+        before = (datetime.datetime.now() - datetime.timedelta(days=retention_days)).isoformat()
+        old_commit = self._git("rev-list", "-1", f"--before={before}", "HEAD").strip()
+        previous_archived = None
+        if os.path.exists(self.archived_marker):
+            with open(self.archived_marker, "r") as fh:
+                previous_archived = fh.read().strip()
+        if not old_commit or old_commit == previous_archived:
+            return None
+
+        revs = f"{old_commit}\n"
+        if previous_archived:
+            revs += f"^{previous_archived}\n"
+        pack_base = os.path.join(self.data_repo.git_dir, "objects", "pack", "pack")
+        pack_hash = self._git("pack-objects", "--revs", "--quiet", pack_base, stdin=revs).strip()
+
+        # A .keep file stops repack from rewriting the pack
+        open(f"{pack_base}-{pack_hash}.keep", "w").close()
+        with open(self.archived_marker, "w") as fh:
+            fh.write(old_commit)
+        log.info(f"Archived history up to {old_commit} into pack-{pack_hash}")
+        return f"pack-{pack_hash}"
+
+    def repack_and_gc(self):
+        """Packs all objects not in archived packs into a single pack and removes old unreachable ones
+
+        gc keeps unreachable objects for its default grace period, objects just
+        written by a run that has not committed yet are left alone.
+        """
+        self._git("gc", "--quiet")
+
+    def run(self, retention_days=0, fsmonitor=False):
+        """Runs all maintenance steps, history is only archived if retention_days is set"""
+        before = self.object_counts()
+        self.optimize_index(fsmonitor=fsmonitor)
+        if retention_days:
+            self.archive_history(retention_days)
+        self.repack_and_gc()
+        after = self.object_counts()
+        log.info(
+            f"Maintenance done: {before['count']} -> {after['count']} loose objects, "
+            f"{before['packs']} -> {after['packs']} packs"
+        )
+        return after
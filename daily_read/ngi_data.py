@@ -7,7 +7,7 @@ from dateutil.relativedelta import relativedelta
 import git
 import gitdb
 
-from daily_read import statusdb
+from daily_read import cassette, data_writer, ugc
 
 log = logging.getLogger(__name__)
 
@@ -28,6 +28,11 @@ class ProjectDataMaster(object):
 
         self.data_location = self.config.DATA_LOCATION
         self.data_repo = self.__setup_data_repo()
+        self.data_writer = data_writer.ProjectFileWriter(
+            self.data_location,
+            os.path.join(self.data_repo.git_dir, "daily_read_tmp"),
+            max_workers=self.config.DATA_WRITER_WORKERS,
+        )
 
         self._data_fetched = False
         self._data_saved = False
@@ -90,11 +95,24 @@ class ProjectDataMaster(object):
 
         self._data_fetched = True
 
+    def load_saved_data(self, relative_paths):
+        """Reads previously saved project files into memory instead of fetching from the sources"""
+
+        for relative_path in relative_paths:
+            abs_path = os.path.join(self.data_location, relative_path)
+            orderer, project_dates, internal_id, internal_name = ProjectDataRecord.data_from_file(abs_path)
+            project_record = ProjectDataRecord(relative_path, orderer, project_dates, internal_id, internal_name)
+            self.data[project_record.project_id] = project_record
+
+        self._data_fetched = True
+        self._data_saved = True
+
     def save_data(self):
         """Saves data to disk, where each project is located in its own file, e.g.:
 
         DATA_LOCATION/ngi_stockholm/2023/NGI09442.json
 
+        Files are written in parallel and replaced atomically, see data_writer.ProjectFileWriter.
         """
         assert self._data_fetched
 
@@ -103,25 +121,7 @@ class ProjectDataMaster(object):
             for project_record in self.get_modified_or_new_projects():
                 log.info(f"{project_record.project_id} from {project_record.ngi_node} had changes not yet reported.")
 
-        for portal_id, project_record in self.data.items():
-            source_year_dir = os.path.join(self.data_location, project_record.relative_dirpath)
-
-            # Save individual projects to json files
-            # Safety check on directory
-            os.makedirs(source_year_dir, exist_ok=True)
-
-            if not os.path.isdir(source_year_dir):
-                raise ValueError(
-                    f"Failed to use data directory {source_year_dir} for download, path exists but is not a directory."
-                )
-
-            abs_path = os.path.join(self.data_location, project_record.relative_path)
-            if os.path.dirname(abs_path) != source_year_dir:  # This should really never happen
-                raise ValueError(f"Error with paths, dirname of {abs_path} should be {year_dir}")
-
-            with open(abs_path, mode="w") as fh:
-                log.debug(f"Writing data for {project_record.project_id} to {abs_path}")
-                fh.write(json.dumps(project_record.data_for_file()))
+        self.data_writer.write(self.data.values())
 
         self._data_saved = True
 
@@ -176,8 +176,20 @@ class ProjectDataMaster(object):
 
         return orderers
 
+    def modified_projects_by_orderer(self):
+        """Returns a dict with orderer as key and a list of modified or new projects as value"""
+        projects_by_orderer = {}
+        for project in self.get_modified_or_new_projects():
+            projects_by_orderer.setdefault(project.orderer, []).append(project)
+
+        return projects_by_orderer
+
     def stage_data_for_project(self, project_record):
-        self.data_repo.index.add([project_record.file_name])
+        self.data_repo.index.add([project_record.relative_path])
+
+    def stage_files(self, relative_paths):
+        """Stages files given as paths relative to the data location"""
+        self.data_repo.index.add(relative_paths)
 
     def commit_staged_data(self, message):
         self.data_repo.index.commit(message)
@@ -230,11 +242,7 @@ class ProjectDataRecord(object):
         if project_dates:
             latest_date, latest_statuses = sorted(project_dates.items(), reverse=True)[0]
 
-            # If multiple statuses for the same date, choose the one with highest prio
-            if len(latest_statuses) > 1:
-                self.status = sorted(latest_statuses, key=lambda s: self.dates_prio[s])[0]
-            else:
-                self.status = latest_statuses[0]
+            self.status = ProjectDataRecord.status_of_date(latest_statuses)
         else:
             log.info(f"No project dates found for {project_id}")
 
@@ -276,6 +284,15 @@ class ProjectDataRecord(object):
 
         return data["orderer"], data["project_dates"], internal_id, internal_name
 
+    def status_of_date(date_statuses):
+        """Class method to choose the status shown for a project from the statuses of its latest date
+
+        If multiple statuses for the same date, choose the one first in the sorting by prio
+        """
+        if len(date_statuses) > 1:
+            return sorted(date_statuses, key=lambda s: ProjectDataRecord.dates_prio.get(s, 0))[0]
+        return date_statuses[0]
+
     def portal_id_from_path(path):
         """Class method to parse out project portal id (e.g. filename without extension) from given path"""
         _, file_name = os.path.split(path)
@@ -289,7 +306,8 @@ class StockholmProjectData(object):
     def __init__(self, config):
         self.name = "NGI Stockholm"
         self.dirname = "NGIS"
-        self.statusdb_session = statusdb.StatusDBSession(config)
+        self.config = config
+        self.statusdb_session = cassette.statusdb_session(config)
 
     def get_data(self, project_id=None, close_date=None):
         """Fetch data from Stockholm StatusDB.
@@ -302,7 +320,7 @@ class StockholmProjectData(object):
             self.get_entry(project_id)
         else:
             if close_date is None:
-                close_date = (datetime.datetime.now() - relativedelta(months=6)).strftime("%Y-%m-%d")
+                close_date = (cassette.now(self.config) - relativedelta(months=6)).strftime("%Y-%m-%d")
             for row in self.statusdb_session.rows(close_date=close_date):
                 order_year = "2023"  # TODO - get order year from data
                 portal_id = row.value["portal_id"]
@@ -321,7 +339,7 @@ class StockholmProjectData(object):
 
     def get_entry(self, project_id):
         """Fetches data for a single project from statusdb"""
-        close_date = (datetime.datetime.now() - relativedelta(months=6)).strftime("%Y-%m-%d")
+        close_date = (cassette.now(self.config) - relativedelta(months=6)).strftime("%Y-%m-%d")
         rows = self.statusdb_session.rows(close_date=close_date)
         for row in rows:
             if row.value["portal_id"] == project_id:
@@ -345,11 +363,47 @@ class SNPSEQProjectData(object):
 
 
 class UGCProjectData(object):
-    """Data class for fetching NGI UGC data"""
+    """Data class for fetching NGI UGC data from the exports in UGC_EXPORTS_LOCATION"""
 
     def __init__(self, config):
         self.name = "Uppsala Genome Center"
         self.dirname = "UGC"
+        self.config = config
+        if not config.UGC_EXPORTS_LOCATION or not os.path.isdir(config.UGC_EXPORTS_LOCATION):
+            raise ValueError(f"UGC exports location is not a directory: {config.UGC_EXPORTS_LOCATION}")
+        # Kept next to the data repository unless a cache location is configured
+        cache_location = config.CACHE_LOCATION or os.path.join(config.DATA_LOCATION, ".git")
+        self.exports = ugc.UGCExports(
+            config.UGC_EXPORTS_LOCATION, os.path.join(cache_location, "daily_read_ugc_exports.json.gz")
+        )
 
-    def get_data(self, project_id=None):
-        pass
+    def get_data(self, project_id=None, close_date=None):
+        """Reads data from the UGC exports.
+
+        If close_date is not given, defaults to 6 months ago. Projects that had
+        all raw data delivered before the close date are left out.
+        """
+        if close_date is None:
+            close_date = (cassette.now(self.config) - relativedelta(months=6)).strftime("%Y-%m-%d")
+
+        self.data = {}
+        for portal_id, project in self.exports.projects().items():
+            if project_id is not None and portal_id != project_id:
+                continue
+            project_dates = project["project_dates"]
+            if not project_dates:
+                continue
+            latest_date = max(project_dates)
+            delivered = "All Raw data Delivered" in project_dates[latest_date]
+            if project_id is None and delivered and latest_date < close_date:
+                continue
+
+            order_year = project["order_year"] or min(project_dates)[:4]
+            relative_path = f"{self.dirname}/{order_year}/{portal_id}.json"
+            self.data[portal_id] = ProjectDataRecord(
+                relative_path, project["orderer"], project_dates, project["internal_id"], project["internal_name"]
+            )
+
+        if project_id is not None and not self.data:
+            raise ValueError(f"Project {project_id} not found in the UGC exports")
+        return self.data
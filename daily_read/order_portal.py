@@ -2,16 +2,126 @@
 
 # Standard
 import base64
+import codecs
 import datetime
+import gzip
+import heapq
+import json
 import logging
+import threading
 from urllib.parse import urljoin
 
 # installed
 import requests
 
+# Own
+from daily_read import cassette, rate_limit
+
 log = logging.getLogger(__name__)
 
 
+_NUMBER_CHARS = "0123456789+-.eE"
+
+
+class _JsonStream(object):
+    """Reads json values one at a time from an iterable of text chunks
+
+    Only the not yet consumed part of the stream is kept in memory.
+    """
+
+    _decoder = json.JSONDecoder()
+
+    def __init__(self, chunks):
+        self.chunks = iter(chunks)
+        self.buffer = ""
+        self.pos = 0
+        self.exhausted = False
+
+    def _fill(self):
+        chunk = next(self.chunks, None)
+        if chunk is None:
+            self.exhausted = True
+            raise json.JSONDecodeError("Unexpected end of data", self.buffer, self.pos)
+        self.buffer = self.buffer[self.pos :] + chunk
+        self.pos = 0
+
+    def peek(self):
+        """Returns the next non-whitespace character without consuming it"""
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in " \t\n\r":
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            self._fill()
+
+    def expect(self, allowed):
+        """Consumes and returns the next non-whitespace character, which has to be one of allowed"""
+        char = self.peek()
+        if char not in allowed:
+            raise json.JSONDecodeError(f"Expected one of {allowed!r}", self.buffer, self.pos)
+        self.pos += 1
+        return char
+
+    def decode(self):
+        """Consumes and returns the next json value"""
+        self.peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                if self.exhausted:
+                    raise
+                self._fill()
+                continue
+            # A number could continue in the next chunk, also when it was cut off after e.g. "1." or "1e"
+            is_number = isinstance(value, (int, float)) and not isinstance(value, bool)
+            if is_number and not self.exhausted and not self.buffer[end:].strip(_NUMBER_CHARS):
+                try:
+                    self._fill()
+                except json.JSONDecodeError:
+                    pass
+                continue
+            self.pos = end
+            return value
+
+
+def iter_json_items(chunks, items_key="items"):
+    """Yields the elements of the list under items_key in a json object given as text chunks
+
+    Other keys of the object are decoded and discarded.
+    """
+    stream = _JsonStream(chunks)
+    stream.expect("{")
+    if stream.peek() == "}":
+        return
+
+    while True:
+        key = stream.decode()
+        stream.expect(":")
+        if key == items_key:
+            stream.expect("[")
+            if stream.peek() == "]":
+                stream.expect("]")
+            else:
+                while True:
+                    yield stream.decode()
+                    if stream.expect(",]") == "]":
+                        break
+        else:
+            stream.decode()
+
+        if stream.expect(",}") == "}":
+            return
+
+
+def _decoded_chunks(response, chunk_size):
+    """Yields the content of a streamed response as text"""
+    decoder = codecs.getincrementaldecoder(response.encoding or "utf-8")()
+    for chunk in response.iter_content(chunk_size=chunk_size):
+        yield decoder.decode(chunk)
+    yield decoder.decode(b"", final=True)
+
+
 class OrderPortal(object):
     """Class to handle NGI order portal interaction"""
 
@@ -35,13 +145,78 @@ class OrderPortal(object):
         self.projects_data = projects_data
         self.all_orders = []
 
-    def _get(self, url, params):
+        # Send uploads gzip compressed, only if the order portal accepts Content-Encoding: gzip
+        self.compress_uploads = config_values.ORDER_PORTAL_GZIP_UPLOADS
+        self.nr_uploads = 0
+        self.uploaded_bytes = 0
+        self._stats_lock = threading.Lock()
+
+        # Connections are reused between requests, pool_size limits the connections kept per host
+        self.timeout = config_values.ORDER_PORTAL_TIMEOUT
+        self.session = cassette.order_portal_session(config_values.cassette)
+        adapter = requests.adapters.HTTPAdapter(
+            pool_connections=config_values.ORDER_PORTAL_POOL_SIZE, pool_maxsize=config_values.ORDER_PORTAL_POOL_SIZE
+        )
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+        initial_concurrency = config_values.ORDER_PORTAL_INITIAL_CONCURRENCY
+        requests_per_second = config_values.ORDER_PORTAL_REQUESTS_PER_SECOND
+        burst = config_values.ORDER_PORTAL_BURST
+        if config_values.cassette is not None and config_values.cassette.replaying:
+            # Recorded responses are there at once and there is no portal to protect, replay at full speed
+            initial_concurrency = config_values.ORDER_PORTAL_MAX_CONCURRENCY
+            requests_per_second, burst = 1e6, 1e6
+
+        # Shared by all requests to the portal, also when they are made from several threads
+        self.limiter = rate_limit.AdaptiveLimiter(
+            initial_concurrency=initial_concurrency,
+            max_concurrency=config_values.ORDER_PORTAL_MAX_CONCURRENCY,
+            target_latency=config_values.ORDER_PORTAL_TARGET_LATENCY,
+            requests_per_second=requests_per_second,
+            burst=burst,
+            max_retries=config_values.ORDER_PORTAL_MAX_RETRIES,
+        )
+        # The same report is uploaded to all projects of an orderer, keep the last encoding
+        self._encoded_report = (None, None)
+
+    def _get(self, url, params, stream=False):
         full_url = urljoin(self.base_url, url)
 
-        return requests.get(full_url, headers=self.headers, params=params)
+        return self.limiter.send(
+            url,
+            lambda: self.session.get(
+                full_url, headers=self.headers, params=params, stream=stream, timeout=self.timeout
+            ),
+        )
 
-    def get_orders(self, node=None, status=None, orderer=None, recent=True):
-        """recent==True would give only 500 most recent orders"""
+    def _project_order(self, order):
+        """Reduces an order to the fields used when processing orders
+
+        The closed date is normalized to an ISO date string (YYYY-MM-DD) so that
+        it can be compared to other dates as a plain string.
+        """
+        closed = (order.get("history") or {}).get("closed")
+        if closed:
+            closed = closed[:10]
+        return {
+            "identifier": order["identifier"],
+            "status": order["status"],
+            "history": {"closed": closed},
+            "reports": [
+                {"name": report["name"], "iuid": report["iuid"]}
+                for report in order.get("reports") or []
+                if report["name"] == "Project Progress"
+            ],
+        }
+
+    def fetch_orders(self, node=None, status=None, orderer=None, recent=True):
+        """Returns orders from the Order Portal, recent==True would give only 500 most recent orders
+
+        The response is parsed one order at a time, orders without fetched data
+        are dropped and the rest are reduced to the fields that are used, so that
+        memory stays bounded also when fetching all orders.
+        """
         log.info("Fetching orders")
         params = {}
         if node:
@@ -54,29 +229,44 @@ class OrderPortal(object):
         if orderer:
             params["owner"] = orderer
 
-        response = self._get("api/v1/orders", params)
+        response = self._get("api/v1/orders", params, stream=True)
 
+        orders = []
         try:
-            self.all_orders = self.all_orders + response.json()["items"]
-        except requests.exceptions.JSONDecodeError as e:
+            for order in iter_json_items(_decoded_chunks(response, self.config_values.ORDER_PORTAL_STREAM_CHUNK_SIZE)):
+                if order["identifier"] not in self.projects_data.data:
+                    log.debug(f"Order portal id: {order['identifier']} not found in data fetched from sources")
+                    continue
+                orders.append(self._project_order(order))
+        except json.JSONDecodeError as e:
             log.critical(
                 f"Could not fetch orders for {{node: {node}, status: {status}, orderer={orderer}, recent={recent}}}"
             )
             raise
+        finally:
+            response.close()
+        return orders
+
+    def get_orders(self, node=None, status=None, orderer=None, recent=True):
+        """Fetches orders (see fetch_orders) and adds them to all_orders"""
+        self.all_orders += self.fetch_orders(node=node, status=status, orderer=orderer, recent=recent)
         log.info(f"Fetched a total of {len(self.all_orders)} order(s) from the Order Portal")
 
-    def process_orders(self, closed_before_in_days=30):
-        """Process orderers orders to select ones that need to be updated"""
+    def process_orders(self, closed_before_in_days=30, orders=None):
+        """Process orderers orders to select ones that need to be updated
+
+        Processes all_orders unless other orders are given.
+        """
+        if orders is None:
+            orders = self.all_orders
 
         order_updates = {}
-        pull_date = datetime.datetime.now()
-        older_than_cutoff = (pull_date - datetime.timedelta(days=closed_before_in_days)).date()
-        for order in self.all_orders:
+        pull_date = cassette.now(self.config_values)
+        # ISO dates compare the same as strings as they do as dates
+        older_than_cutoff = (pull_date - datetime.timedelta(days=closed_before_in_days)).date().isoformat()
+        for order in orders:
             # Skip projects closed some time ago or if data is not available
-            if (
-                order["status"] == "closed"
-                and datetime.datetime.strptime(order["history"]["closed"], "%Y-%m-%d").date() >= older_than_cutoff
-            ):
+            if order["status"] == "closed" and order["history"]["closed"] >= older_than_cutoff:
                 continue
             elif order["identifier"] not in self.projects_data.data.keys():
                 log.debug(f"Order portal id: {order['identifier']} not found in data fetched from sources")
@@ -104,14 +294,13 @@ class OrderPortal(object):
 
             order_updates_item = order_updates[proj_info.orderer]
             order_updates_item["events"] += proj_info.events
-
-            # Sort the statuses based on date and extract the 5 first (done repeatedly for each new project added)
-            orderer_recents = sorted(order_updates_item["events"], reverse=True)[:5]
-
-            order_updates_item["recents"] = orderer_recents
             order_updates_item["projects"].setdefault(proj_info.status, []).append(proj_info)
             order_updates_item["active_projects"] += 1
 
+        # Extract the 5 latest events per orderer, events start with an ISO date so they sort by date
+        for order_updates_item in order_updates.values():
+            order_updates_item["recents"] = heapq.nlargest(5, order_updates_item["events"])
+
         return order_updates
 
     def upload_report_to_order_portal(self, report, project):
@@ -121,20 +310,34 @@ class OrderPortal(object):
         if project.report_iuid:
             add_to_url = f"/{project.report_iuid}"
         url = f"{self.base_url}/api/v1/report{add_to_url}"
+        cached_report, encoded_report = self._encoded_report
+        if cached_report is not report:
+            encoded_report = base64.b64encode(report.encode()).decode("utf-8")
+            self._encoded_report = (report, encoded_report)
         indata = dict(
             order=project.project_id,
             name="Project Progress",
             status="published",
             file=dict(
-                data=base64.b64encode(report.encode()).decode("utf-8"),
+                data=encoded_report,
                 filename="project_progress.html",
                 content_type="text/html",
             ),
         )
 
         # TODO: check Encoded to utf-8 to display special characters properly
-        response = requests.post(url, headers=self.headers, json=indata)
+        body = json.dumps(indata).encode("utf-8")
+        headers = dict(self.headers, **{"Content-Type": "application/json"})
+        if self.compress_uploads:
+            body = gzip.compress(body)
+            headers["Content-Encoding"] = "gzip"
+        response = self.limiter.send(
+            "api/v1/report", lambda: self.session.post(url, headers=headers, data=body, timeout=self.timeout)
+        )
 
         assert response.status_code == 200, (response.status_code, response.reason)
+        with self._stats_lock:
+            self.nr_uploads += 1
+            self.uploaded_bytes += len(body)
 
         log.info(f"Updated report for order with project id: {project.project_id}")
@@ -0,0 +1,104 @@
+"""Module to run work items through a sequence of concurrent stages"""
+
+# Standard
+import logging
+import queue
+import threading
+
+log = logging.getLogger(__name__)
+
+# Marks the end of the items in a queue
+_DONE = object()
+
+
+class Stage(object):
+    """A step of the pipeline.
+
+    func is called with (key, payload) and returns a list of (key, payload) for
+    the next stage, nr_workers threads call it concurrently.
+    """
+
+    def __init__(self, name, func, nr_workers=1):
+        self.name = name
+        self.func = func
+        self.nr_workers = nr_workers
+
+
+class Failure(object):
+    """Result for an item that raised an exception in one of the stages"""
+
+    def __init__(self, stage_name, key, exception):
+        self.stage_name = stage_name
+        self.key = key
+        self.exception = exception
+
+
+class Pipeline(object):
+    """Class to stream items through stages connected by bounded queues
+
+    An item moves on to the next stage as soon as it is done with the current
+    one, so the stages overlap and the total time approaches the time of the
+    slowest stage rather than the sum of them. The bounded queues make a fast
+    stage wait for a slow one instead of piling up items in memory.
+    """
+
+    def __init__(self, stages, queue_size=8):
+        self.stages = stages
+        self.queue_size = queue_size
+
+    def _run_stage(self, stage, in_queue, out_queue, results, workers_left, lock):
+        while True:
+            item = in_queue.get()
+            if item is _DONE:
+                # Let the other workers of this stage see it as well
+                in_queue.put(_DONE)
+                break
+
+            key, payload = item
+            try:
+                for next_item in stage.func(key, payload):
+                    out_queue.put(next_item)
+            except Exception as e:
+                log.error(f"{stage.name} failed for {key}: {e}")
+                results.put(Failure(stage.name, key, e))
+
+        with lock:
+            workers_left[stage.name] -= 1
+            last_worker = workers_left[stage.name] == 0
+        if last_worker:
+            out_queue.put(_DONE)
+
+    def _feed(self, items, in_queue):
+        for item in items:
+            in_queue.put(item)
+        in_queue.put(_DONE)
+
+    def run(self, items):
+        """Yields the (key, payload) results of the last stage, or Failure, as soon as they are ready
+
+        items: iterable of (key, payload) for the first stage
+        """
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in self.stages]
+        # Not bounded, results are consumed by the caller and failures come from all stages
+        results = queue.Queue()
+        queues.append(results)
+
+        lock = threading.Lock()
+        workers_left = {stage.name: stage.nr_workers for stage in self.stages}
+        threads = [threading.Thread(target=self._feed, args=(items, queues[0]), daemon=True)]
+        for i, stage in enumerate(self.stages):
+            for _ in range(stage.nr_workers):
+                args = (stage, queues[i], queues[i + 1], results, workers_left, lock)
+                threads.append(threading.Thread(target=self._run_stage, args=args, daemon=True))
+
+        for thread in threads:
+            thread.start()
+
+        while True:
+            result = results.get()
+            if result is _DONE:
+                break
+            yield result
+
+        for thread in threads:
+            thread.join()
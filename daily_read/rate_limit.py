@@ -0,0 +1,187 @@
+"""Module to limit the request rate and concurrency towards a remote service"""
+
+# Standard
+import datetime
+import email.utils
+import logging
+import threading
+import time
+
+log = logging.getLogger(__name__)
+
+THROTTLED_STATUS_CODES = (429, 503)
+
+
+def parse_retry_after(value, now=None):
+    """Returns the number of seconds to wait from a Retry-After header value, or None if not parsable
+
+    The value is either a number of seconds or an HTTP date.
+    """
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if now is None:
+        now = datetime.datetime.now(datetime.timezone.utc)
+    return max(0.0, (retry_at - now).total_seconds())
+
+
+class TokenBucket(object):
+    """Class for a thread safe token bucket, allowing bursts of capacity requests and rate requests per second"""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Blocks until a token is available and takes it"""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class AdaptiveLimiter(object):
+    """Class to adapt the number of concurrent requests to how the service responds
+
+    Concurrency is controlled with AIMD: the limit grows by one for every limit
+    successful requests with a latency below target_latency, and is halved when a
+    request is slow, throttled (429/503) or fails without a response. The limit
+    is halved at most once per round trip: requests that were sent before the
+    last decrease do not lower it again. A Retry-After header holds back all
+    requests until it has passed. On top of that, each endpoint has its own
+    token bucket capping the request rate.
+    """
+
+    def __init__(
+        self,
+        initial_concurrency=2,
+        min_concurrency=1,
+        max_concurrency=16,
+        target_latency=2.0,
+        requests_per_second=10.0,
+        burst=10,
+        max_retries=5,
+    ):
+        self.limit = float(initial_concurrency)
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max_concurrency
+        self.target_latency = target_latency
+        self.requests_per_second = requests_per_second
+        self.burst = burst
+        self.max_retries = max_retries
+
+        self.condition = threading.Condition()
+        self.in_flight = 0
+        self.blocked_until = 0.0
+        self.last_decrease = float("-inf")
+        self.buckets = {}
+
+        self.nr_requests = 0
+        self.nr_throttled = 0
+        self.first_request = None
+        self.last_response = None
+
+    def _bucket(self, endpoint):
+        with self.condition:
+            if endpoint not in self.buckets:
+                self.buckets[endpoint] = TokenBucket(self.requests_per_second, self.burst)
+            return self.buckets[endpoint]
+
+    def _acquire_slot(self):
+        with self.condition:
+            while True:
+                wait = self.blocked_until - time.monotonic()
+                if wait > 0:
+                    self.condition.wait(wait)
+                elif self.in_flight >= int(self.limit):
+                    self.condition.wait()
+                else:
+                    self.in_flight += 1
+                    if self.first_request is None:
+                        self.first_request = time.monotonic()
+                    return
+
+    def _decrease(self, start):
+        # The responses to requests sent before the last decrease reflect the load before it
+        if start >= self.last_decrease:
+            self.limit = max(self.min_concurrency, self.limit / 2)
+            self.last_decrease = time.monotonic()
+
+    def _release_slot(self, start, throttled, retry_after, failed=False):
+        with self.condition:
+            now = time.monotonic()
+            self.in_flight -= 1
+            self.nr_requests += 1
+            self.last_response = now
+            if throttled:
+                self.nr_throttled += 1
+                self._decrease(start)
+                if retry_after:
+                    self.blocked_until = max(self.blocked_until, now + retry_after)
+            elif failed or now - start > self.target_latency:
+                self._decrease(start)
+            else:
+                self.limit = min(self.max_concurrency, self.limit + 1 / self.limit)
+            self.condition.notify_all()
+
+    def send(self, endpoint, send_request):
+        """Sends a request through the limiter, retrying when throttled, and returns the response
+
+        send_request: callable without arguments that performs the request and returns a requests.Response
+        """
+        bucket = self._bucket(endpoint)
+        for attempt in range(self.max_retries + 1):
+            self._acquire_slot()
+            bucket.acquire()
+            start = time.monotonic()
+            try:
+                response = send_request()
+            except BaseException:
+                # No response at all (e.g. connection reset or refused) is a sign of congestion as well
+                self._release_slot(start, throttled=False, retry_after=None, failed=True)
+                raise
+
+            throttled = response.status_code in THROTTLED_STATUS_CODES
+            retry_after = None
+            if throttled:
+                retry_after = parse_retry_after(response.headers.get("Retry-After"))
+                if retry_after is None:
+                    retry_after = min(60, 2**attempt)
+            self._release_slot(start, throttled, retry_after)
+
+            if not throttled or attempt == self.max_retries:
+                return response
+            response.close()
+            log.warning(
+                f"Request to {endpoint} throttled ({response.status_code}), "
+                f"concurrency lowered to {int(self.limit)}, retrying after {retry_after:.1f} s"
+            )
+
+    def stats(self):
+        """Returns a dict with the number of requests, throttled responses, achieved rate and current limit"""
+        with self.condition:
+            elapsed = 0.0
+            if self.first_request is not None and self.last_response is not None:
+                elapsed = self.last_response - self.first_request
+            return {
+                "requests": self.nr_requests,
+                "throttled": self.nr_throttled,
+                "requests_per_second": self.nr_requests / elapsed if elapsed > 0 else 0.0,
+                "concurrency_limit": int(self.limit),
+            }
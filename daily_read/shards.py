@@ -0,0 +1,138 @@
+"""Module to split the orderers of a run into shards that can be handled by separate workers"""
+
+# Standard
+import datetime
+import glob
+import hashlib
+import json
+import logging
+import os
+
+log = logging.getLogger(__name__)
+
+
+def parse_shard(shard_string):
+    """Parses a shard given as "i/N" (1-based) into a tuple (i, N)
+
+    Raises ValueError if the string is not a valid shard.
+    """
+    try:
+        index, count = (int(part) for part in shard_string.split("/"))
+    except ValueError:
+        raise ValueError(f"Shard should be given as i/N, e.g. 2/4, got: {shard_string}")
+
+    if count < 1 or not 1 <= index <= count:
+        raise ValueError(f"Shard index should be between 1 and {count}, got: {shard_string}")
+
+    return index, count
+
+
+def shard_for_orderer(orderer, nr_shards):
+    """Returns the (1-based) shard an orderer belongs to.
+
+    A stable hash is used, as the builtin hash() is salted per process and
+    would give different partitions on different workers.
+    """
+    digest = hashlib.sha1(orderer.encode("utf-8")).hexdigest()
+    return int(digest, 16) % nr_shards + 1
+
+
+def orderers_in_shard(orderers, shard_index, nr_shards):
+    """Returns the orderers, in sorted order, that belong to the given shard"""
+    return sorted(orderer for orderer in orderers if orderer and shard_for_orderer(orderer, nr_shards) == shard_index)
+
+
+class ShardOutcomes(object):
+    """Class to handle the per-shard outcome files written by workers and merged by the coordinator
+
+    Before the workers start, a single step fetches and saves the data for all
+    shards and lists the saved files in OUTCOMES_LOCATION/saved_data.json. Each
+    worker reads the data from there and writes one file, e.g.
+    OUTCOMES_LOCATION/shard_2_of_4.json, with the upload outcome and the
+    modified data files for each of its orderers.
+    """
+
+    def __init__(self, outcomes_location):
+        self.outcomes_location = outcomes_location
+        self.saved_data_path = os.path.join(outcomes_location, "saved_data.json")
+
+    def write_saved_files(self, relative_paths):
+        """Lists the data files saved for the shards to read"""
+        os.makedirs(self.outcomes_location, exist_ok=True)
+        tmp_file_path = f"{self.saved_data_path}.tmp"
+        with open(tmp_file_path, mode="w") as fh:
+            json.dump({"saved": f"{datetime.datetime.now()}", "files": relative_paths}, fh)
+        os.replace(tmp_file_path, self.saved_data_path)
+
+    def read_saved_files(self):
+        """Returns the data files saved for the shards, or None if the data has not been saved"""
+        if not os.path.exists(self.saved_data_path):
+            return None
+        with open(self.saved_data_path, "r") as fh:
+            return json.load(fh)["files"]
+
+    def _file_path(self, shard_index, nr_shards):
+        return os.path.join(self.outcomes_location, f"shard_{shard_index}_of_{nr_shards}.json")
+
+    def write(self, shard_index, nr_shards, orderer_outcomes):
+        """Writes outcomes for a shard.
+
+        orderer_outcomes: dict with orderer as key and value {"uploaded": bool, "files": [relative paths]}
+        """
+        os.makedirs(self.outcomes_location, exist_ok=True)
+        file_path = self._file_path(shard_index, nr_shards)
+        outcome = {
+            "shard": shard_index,
+            "nr_shards": nr_shards,
+            "finished": f"{datetime.datetime.now()}",
+            "orderers": orderer_outcomes,
+        }
+        # Write to a temporary file first so that the coordinator never reads a partial outcome
+        tmp_file_path = f"{file_path}.tmp"
+        with open(tmp_file_path, mode="w") as fh:
+            json.dump(outcome, fh)
+        os.replace(tmp_file_path, file_path)
+        log.info(f"Wrote outcome for shard {shard_index}/{nr_shards} to {file_path}")
+        return file_path
+
+    def read_all(self):
+        """Returns a list of all shard outcomes found, sorted on shard index"""
+        outcomes = []
+        for file_path in glob.glob(os.path.join(self.outcomes_location, "shard_*_of_*.json")):
+            with open(file_path, "r") as fh:
+                outcome = json.load(fh)
+            outcome["file_path"] = file_path
+            outcomes.append(outcome)
+        return sorted(outcomes, key=lambda outcome: (outcome["nr_shards"], outcome["shard"]))
+
+    def missing_shards(self, outcomes):
+        """Returns shards (as "i/N" strings) not yet reported, raises ValueError if shard counts differ"""
+        nr_shards_found = {outcome["nr_shards"] for outcome in outcomes}
+        if len(nr_shards_found) > 1:
+            raise ValueError(f"Outcomes from runs with different number of shards found: {sorted(nr_shards_found)}")
+        if not nr_shards_found:
+            return []
+        nr_shards = nr_shards_found.pop()
+        reported = {outcome["shard"] for outcome in outcomes}
+        return [f"{index}/{nr_shards}" for index in range(1, nr_shards + 1) if index not in reported]
+
+    def merge(self, outcomes):
+        """Merges outcomes into (files_to_stage, uploaded_orderers, failed_orderers)"""
+        files_to_stage = set()
+        uploaded_orderers = []
+        failed_orderers = []
+        for outcome in outcomes:
+            for orderer, orderer_outcome in outcome["orderers"].items():
+                if orderer_outcome["uploaded"]:
+                    uploaded_orderers.append(orderer)
+                    files_to_stage.update(orderer_outcome["files"])
+                else:
+                    failed_orderers.append(orderer)
+        return sorted(files_to_stage), uploaded_orderers, failed_orderers
+
+    def clear(self, outcomes):
+        """Removes the outcome files and the list of saved data files once they have been merged"""
+        for outcome in outcomes:
+            os.remove(outcome["file_path"])
+        if os.path.exists(self.saved_data_path):
+            os.remove(self.saved_data_path)
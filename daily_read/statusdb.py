@@ -1,9 +1,12 @@
 """Classes for handling various utility functions"""
 
 
+import concurrent.futures
+import datetime
 import logging
 
 import couchdb
+import couchdb.http
 
 log = logging.getLogger(__name__)
 
@@ -18,7 +21,10 @@ class StatusDBSession(object):
         display_url_string = "https://{}:{}@{}".format(
             config.STHLM_STATUSDB_USERNAME, "*********", config.STHLM_STATUSDB_URL
         )
-        self.connection = couchdb.Server(url=url_string)
+        self.page_size = config.STATUSDB_PAGE_SIZE
+        self.partition_days = config.STATUSDB_PARTITION_DAYS
+        self.partition_workers = config.STATUSDB_PARTITION_WORKERS
+        self.connection = couchdb.Server(url=url_string, session=couchdb.http.Session(timeout=config.STATUSDB_TIMEOUT))
         if not self.connection:
             raise Exception("Couchdb connection failed for url {}".format(display_url_string))
         self.db_connection = self.connection["projects"]
@@ -27,6 +33,48 @@ class StatusDBSession(object):
             "project/dailyread_dates",
         )
 
+    def _view_rows(self, **options):
+        if self.page_size:
+            return list(self.db_connection.iterview("project/dailyread_dates", self.page_size, **options))
+        return self.db_connection.view("project/dailyread_dates", **options).rows
+
+    def date_windows(self, close_date, today=None):
+        """Returns the view query options that split the keys from close_date up to the top into windows
+
+        Windows are partition_days long and given in descending key order, so
+        that their rows put after each other are the same as the rows of a
+        single query. Keys after today (e.g. of open projects) get a window of
+        their own.
+        """
+        if today is None:
+            today = datetime.date.today()
+        bounds = [datetime.date.fromisoformat(close_date)]
+        while bounds[-1] < today:
+            bounds.append(min(today, bounds[-1] + datetime.timedelta(days=self.partition_days)))
+        keys = [[bound.isoformat(), "ZZZZ"] for bound in bounds]
+
+        windows = [dict(endkey=keys[-1], inclusive_end=False)]
+        for high_key, low_key in zip(reversed(keys[1:]), reversed(keys[:-1])):
+            windows.append(dict(startkey=high_key, endkey=low_key, inclusive_end=False))
+        # The lowest window ends at close_date, as a single query does
+        windows[-1]["inclusive_end"] = True
+        return windows
+
     def rows(self, close_date=None):
-        view = self.db_connection.view("project/dailyread_dates", descending=True, endkey=[close_date, "ZZZZ"])
-        return view.rows
+        """Returns rows of the dailyread_dates view, fetched in pages of page_size rows if set
+
+        Long lookbacks (more than partition_days back) are fetched as concurrent
+        queries for date windows, see date_windows, and merged in key order.
+        """
+        if close_date is None or not self.partition_days:
+            return self._view_rows(descending=True, endkey=[close_date, "ZZZZ"])
+
+        windows = self.date_windows(close_date)
+        if len(windows) <= 2:
+            return self._view_rows(descending=True, endkey=[close_date, "ZZZZ"])
+
+        log.info(f"Fetching rows since {close_date} from StatusDB in {len(windows)} windows")
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.partition_workers) as executor:
+            # map gives the results in the order of the windows
+            window_rows = executor.map(lambda options: self._view_rows(descending=True, **options), windows)
+            return [row for rows in window_rows for row in rows]
@@ -0,0 +1,149 @@
+"""Module to ingest the tabular project status exports from Uppsala Genome Center"""
+
+# Standard
+import csv
+import gzip
+import hashlib
+import json
+import logging
+import os
+
+log = logging.getLogger(__name__)
+
+EXPORT_EXTENSIONS = (".csv", ".tsv", ".txt", ".csv.gz", ".tsv.gz", ".txt.gz")
+REQUIRED_COLUMNS = ["portal_id", "orderer", "status", "date"]
+
+
+def _open_export(export_path):
+    if export_path.endswith(".gz"):
+        return gzip.open(export_path, "rt", newline="")
+    return open(export_path, "r", newline="")
+
+
+def file_checksum(file_path, chunk_size=1024 * 1024):
+    """Returns the sha256 hex digest of a file, read in chunks"""
+    checksum = hashlib.sha256()
+    with open(file_path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(chunk_size), b""):
+            checksum.update(chunk)
+    return checksum.hexdigest()
+
+
+def parse_export(export_path):
+    """Returns a dict with portal id as key and the project info as value, from one export
+
+    Exports have one row per status event, with the columns portal_id, orderer,
+    status and date and optionally project_id, project_name and order_year.
+    Files ending with .csv are comma separated, others tab separated. Rows are
+    read one at a time so that only the projects are kept in memory.
+    """
+    delimiter = "," if export_path.endswith((".csv", ".csv.gz")) else "\t"
+    projects = {}
+    with _open_export(export_path) as fh:
+        reader = csv.DictReader(fh, delimiter=delimiter)
+        missing_columns = [column for column in REQUIRED_COLUMNS if column not in (reader.fieldnames or [])]
+        if missing_columns:
+            raise ValueError(f"Columns {', '.join(missing_columns)} missing in UGC export {export_path}")
+
+        for line_nr, row in enumerate(reader, start=2):
+            portal_id = row["portal_id"]
+            date = (row["date"] or "")[:10]
+            if not portal_id or not date:
+                log.debug(f"Skipping line {line_nr} of {export_path}, portal id or date missing")
+                continue
+
+            project = projects.setdefault(
+                portal_id,
+                {
+                    "orderer": row["orderer"],
+                    "project_dates": {},
+                    "internal_id": row.get("project_id") or None,
+                    "internal_name": row.get("project_name") or None,
+                    "order_year": row.get("order_year") or None,
+                },
+            )
+            statuses = project["project_dates"].setdefault(date, [])
+            if row["status"] not in statuses:
+                statuses.append(row["status"])
+    return projects
+
+
+class UGCExports(object):
+    """Class to read all exports in a directory, skipping exports that did not change since the last run
+
+    The projects parsed from each export are kept in a gzipped json cache together
+    with the export's checksum, size and modification time. An export with the
+    same size and modification time is not read at all, one with the same
+    checksum is not parsed again.
+    """
+
+    def __init__(self, exports_location, cache_path):
+        self.exports_location = exports_location
+        self.cache_path = cache_path
+        self.cache = {}
+        if os.path.exists(self.cache_path):
+            with gzip.open(self.cache_path, "rt") as fh:
+                self.cache = json.load(fh)
+        self.nr_parsed = 0
+
+    def export_paths(self):
+        return sorted(
+            os.path.join(self.exports_location, file_name)
+            for file_name in os.listdir(self.exports_location)
+            if file_name.endswith(EXPORT_EXTENSIONS)
+        )
+
+    def _save_cache(self):
+        tmp_cache_path = f"{self.cache_path}.tmp"
+        with gzip.open(tmp_cache_path, "wt") as fh:
+            json.dump(self.cache, fh)
+        os.replace(tmp_cache_path, self.cache_path)
+
+    def _export_projects(self, export_path):
+        file_name = os.path.basename(export_path)
+        stat = os.stat(export_path)
+        cached = self.cache.get(file_name)
+        if cached is not None and (cached["size"], cached["mtime_ns"]) == (stat.st_size, stat.st_mtime_ns):
+            return cached["projects"]
+
+        checksum = file_checksum(export_path)
+        if cached is not None and cached["checksum"] == checksum:
+            log.debug(f"{file_name} is unchanged, using the cached projects")
+            projects = cached["projects"]
+        else:
+            log.info(f"Parsing UGC export {file_name}")
+            projects = parse_export(export_path)
+            self.nr_parsed += 1
+        self.cache[file_name] = {
+            "checksum": checksum,
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "projects": projects,
+        }
+        return projects
+
+    def projects(self):
+        """Returns a dict with portal id as key and the project info merged from all exports"""
+        export_paths = self.export_paths()
+        cached_file_names = set(self.cache)
+
+        merged = {}
+        for export_path in export_paths:
+            for portal_id, project in self._export_projects(export_path).items():
+                if portal_id not in merged:
+                    merged[portal_id] = dict(project, project_dates={})
+                project_dates = merged[portal_id]["project_dates"]
+                for date, statuses in project["project_dates"].items():
+                    date_statuses = project_dates.setdefault(date, [])
+                    date_statuses += [status for status in statuses if status not in date_statuses]
+
+        # Forget about exports that have been removed
+        for file_name in cached_file_names - {os.path.basename(export_path) for export_path in export_paths}:
+            del self.cache[file_name]
+        self._save_cache()
+
+        log.info(
+            f"Read {len(merged)} project(s) from {len(export_paths)} UGC export(s), "
+            f"{self.nr_parsed} of which had to be parsed"
+        )
+        return merged
@@ -0,0 +1,95 @@
+import datetime
+import json
+import os
+import types
+
+import couchdb.client
+from dateutil.relativedelta import relativedelta
+import pytest
+import requests
+
+from daily_read import cassette, config, ngi_data, order_portal, statusdb
+
+
+class FakeStatusDBSession(object):
+    def rows(self, close_date=None):
+        value = {
+            "portal_id": "NGI0001",
+            "proj_dates": {"2023-01-01": ["Samples Received"]},
+            "orderer": "pi@example.com",
+            "project_id": "P1",
+            "project_name": "A.Name_23_01",
+        }
+        return [couchdb.client.Row(id="1", key=[close_date, "P1"], value=value)]
+
+
+def _fake_request(self, method, url, params=None, **kwargs):
+    response = requests.Response()
+    response.status_code = 200
+    response.encoding = "utf-8"
+    response._content = json.dumps({"items": [{"method": method, "params": params}]}).encode()
+    return response
+
+
+def test_record_and_replay(tmp_path, monkeypatch):
+    cassette_path = os.path.join(tmp_path, "cassette.json.gz")
+    monkeypatch.setattr(requests.Session, "request", _fake_request)
+
+    recording = cassette.Cassette(cassette_path)
+    statusdb_session = cassette.RecordingStatusDBSession(FakeStatusDBSession(), recording)
+    assert statusdb_session.rows(close_date="2023-01-01")[0].value["portal_id"] == "NGI0001"
+    session = cassette.order_portal_session(recording)
+    first = session.get("https://op.example.com/api/v1/orders", params={"owner": "pi@example.com"}, stream=True)
+    second = session.post("https://op.example.com/api/v1/report", data=b"report")
+    recording.save()
+
+    monkeypatch.undo()
+    config_values = config.Config()
+    config_values.cassette = cassette.Cassette(cassette_path, replaying=True)
+
+    # No StatusDB connection is made when replaying
+    statusdb_session = cassette.statusdb_session(config_values)
+    rows = statusdb_session.rows(close_date="2023-01-01")
+    assert rows[0].key == ["2023-01-01", "P1"]
+    assert rows[0].value["portal_id"] == "NGI0001"
+    with pytest.raises(ValueError):
+        statusdb_session.rows(close_date="2020-01-01")
+
+    session = cassette.order_portal_session(config_values.cassette)
+    response = session.get("https://other.example.com/api/v1/orders", params={"owner": "pi@example.com"}, stream=True)
+    assert b"".join(response.iter_content(chunk_size=3)) == first.content
+    assert session.post("https://op.example.com/api/v1/report", data=b"report").content == second.content
+
+    # Every recorded response is replayed once
+    with pytest.raises(requests.exceptions.ConnectionError):
+        session.post("https://op.example.com/api/v1/report", data=b"report")
+
+
+def test_replay_on_a_later_day(tmp_path, monkeypatch):
+    cassette_path = os.path.join(tmp_path, "cassette.json.gz")
+    monkeypatch.setattr(statusdb, "StatusDBSession", lambda config: FakeStatusDBSession())
+
+    config_values = config.Config()
+    config_values.cassette = cassette.Cassette(cassette_path)
+    # Recorded some time ago, the close date of the recording is not the one of today
+    config_values.cassette.reference_time -= datetime.timedelta(days=40)
+    recorded_data = ngi_data.StockholmProjectData(config_values).get_data()
+    recorded_close_date = (config_values.cassette.reference_time - relativedelta(months=6)).strftime("%Y-%m-%d")
+    assert list(config_values.cassette.interactions) == [f"statusdb rows {recorded_close_date}"]
+    config_values.cassette.save()
+
+    monkeypatch.undo()
+    config_values = config.Config()
+    config_values.cassette = cassette.Cassette(cassette_path, replaying=True)
+    projects_data = types.SimpleNamespace(data=ngi_data.StockholmProjectData(config_values).get_data())
+    assert list(projects_data.data) == list(recorded_data)
+
+    # Reports get the date of the recording
+    config_values.ORDER_PORTAL_URL = "https://op.example.com"
+    config_values.ORDER_PORTAL_API_KEY = "key"
+    op = order_portal.OrderPortal(config_values, projects_data)
+    order = {"identifier": "NGI0001", "status": "accepted", "history": {"closed": None}, "reports": []}
+    order_updates = op.process_orders(orders=[order])
+    assert order_updates["pi@example.com"]["pull_date"].startswith(
+        config_values.cassette.reference_time.isoformat()[:10]
+    )
@@ -0,0 +1,75 @@
+import pytest
+
+from daily_read import config
+
+
+def test_performance_settings_from_file_and_environment(tmp_path, monkeypatch):
+    config_file = tmp_path / "daily_read.yaml"
+    config_file.write_text("order_portal:\n  timeout: 30\n  upload_workers: 2\nreport:\n  panel_cache_size: 10\n")
+    monkeypatch.setenv("DAILY_READ_CONFIG_FILE", str(config_file))
+    monkeypatch.setenv("DAILY_READ_ORDER_PORTAL_UPLOAD_WORKERS", "4")
+    monkeypatch.setenv("DAILY_READ_ORDER_PORTAL_API_KEY", "secret")
+
+    config_values = config.Config()
+
+    assert config_values.ORDER_PORTAL_TIMEOUT == 30.0
+    assert config_values.ORDER_PORTAL_UPLOAD_WORKERS == 4
+    assert config_values.REPORT_PANEL_CACHE_SIZE == 10
+    assert config_values.DATA_WRITER_WORKERS == config.PERFORMANCE_DEFAULTS["data"]["writer_workers"]
+    assert config_values.sources["ORDER_PORTAL_TIMEOUT"] == str(config_file)
+    assert config_values.sources["ORDER_PORTAL_UPLOAD_WORKERS"] == "DAILY_READ_ORDER_PORTAL_UPLOAD_WORKERS"
+
+    effective_values = {attribute: value for attribute, value, _ in config_values.effective_values()}
+    assert effective_values["ORDER_PORTAL_API_KEY"] == "*********"
+    assert effective_values["ORDER_PORTAL_UPLOAD_WORKERS"] == 4
+
+
+def test_invalid_performance_settings(tmp_path, monkeypatch):
+    config_file = tmp_path / "daily_read.yaml"
+    config_file.write_text("order_portal:\n  timeot: 30\n")
+    monkeypatch.setenv("DAILY_READ_CONFIG_FILE", str(config_file))
+    with pytest.raises(ValueError, match="order_portal.timeot"):
+        config.Config()
+
+    monkeypatch.delenv("DAILY_READ_CONFIG_FILE")
+    for invalid_value in ["many", "0", "-1"]:
+        monkeypatch.setenv("DAILY_READ_ORDER_PORTAL_FETCH_WORKERS", invalid_value)
+        with pytest.raises(ValueError, match="ORDER_PORTAL_FETCH_WORKERS"):
+            config.Config()
+
+
+def test_on_off_settings(tmp_path, monkeypatch):
+    assert config.Config().ORDER_PORTAL_GZIP_UPLOADS is False
+
+    for value, expected in [("false", False), ("0", False), ("", False), ("True", True), ("1", True), ("yes", True)]:
+        monkeypatch.setenv("DAILY_READ_ORDER_PORTAL_GZIP_UPLOADS", value)
+        assert config.Config().ORDER_PORTAL_GZIP_UPLOADS is expected
+
+    monkeypatch.setenv("DAILY_READ_ORDER_PORTAL_GZIP_UPLOADS", "sometimes")
+    with pytest.raises(ValueError, match="ORDER_PORTAL_GZIP_UPLOADS"):
+        config.Config()
+
+    monkeypatch.delenv("DAILY_READ_ORDER_PORTAL_GZIP_UPLOADS")
+    config_file = tmp_path / "daily_read.yaml"
+    config_file.write_text("order_portal:\n  gzip_uploads: true\n")
+    monkeypatch.setenv("DAILY_READ_CONFIG_FILE", str(config_file))
+    assert config.Config().ORDER_PORTAL_GZIP_UPLOADS is True
+
+
+def test_zero_means_off(tmp_path, monkeypatch):
+    monkeypatch.setenv("DAILY_READ_STATUSDB_PARTITION_DAYS", "0")
+    monkeypatch.setenv("DAILY_READ_ORDER_PORTAL_MAX_RETRIES", "0")
+    config_values = config.Config()
+    assert config_values.STATUSDB_PARTITION_DAYS == 0
+    assert config_values.ORDER_PORTAL_MAX_RETRIES == 0
+
+    monkeypatch.delenv("DAILY_READ_STATUSDB_PARTITION_DAYS")
+    config_file = tmp_path / "daily_read.yaml"
+    config_file.write_text("statusdb:\n  partition_days: 0\n")
+    monkeypatch.setenv("DAILY_READ_CONFIG_FILE", str(config_file))
+    assert config.Config().STATUSDB_PARTITION_DAYS == 0
+
+    # Still not allowed for other settings
+    monkeypatch.setenv("DAILY_READ_STATUSDB_PARTITION_WORKERS", "0")
+    with pytest.raises(ValueError, match="STATUSDB_PARTITION_WORKERS"):
+        config.Config()
@@ -0,0 +1,94 @@
+import os
+
+from daily_read import daily_report, ngi_data
+
+STATUS_PRIORITY = {1: "Samples Received", 2: "Library QC finished"}
+
+
+def _report_data(projects):
+    return {
+        "pull_date": "2023-05-04 10:11:12.131415",
+        "active_projects": len(projects),
+        "recents": [],
+        "events": [],
+        "projects": {"Library QC finished": projects},
+    }
+
+
+def _project(portal_id, project_dates):
+    return ngi_data.ProjectDataRecord(f"NGIS/2023/{portal_id}.json", "pi@example.com", project_dates, None, portal_id)
+
+
+def test_populate_report_reuses_unchanged_panels():
+    daily_rep = daily_report.DailyReport()
+    unchanged = _project("NGI0001", {"2023-05-01": ["Library QC finished"]})
+    changed = _project("NGI0002", {"2023-05-02": ["Library QC finished"]})
+
+    report = daily_rep.populate_and_write_report("pi@example.com", _report_data([unchanged, changed]), STATUS_PRIORITY)
+    assert "panel_project_NGI0001" in report
+    assert "panel_project_NGI0002" in report
+    assert daily_rep.panel_cache_misses == 2
+
+    changed = _project("NGI0002", {"2023-05-02": ["Library QC finished"], "2023-05-03": ["Library QC finished"]})
+    report = daily_rep.populate_and_write_report("pi@example.com", _report_data([unchanged, changed]), STATUS_PRIORITY)
+    assert "2023-05-03" in report
+    assert daily_rep.panel_cache_hits == 1
+    assert daily_rep.panel_cache_misses == 3
+
+
+def test_panel_cache_evicts_least_recently_used():
+    daily_rep = daily_report.DailyReport(panel_cache_size=2)
+    projects = [_project(f"NGI000{i}", {"2023-05-01": ["Samples Received"]}) for i in range(3)]
+
+    for project in projects:
+        daily_rep.render_project_panel(project)
+    assert len(daily_rep._panel_cache) == 2
+
+    daily_rep.render_project_panel(projects[0])
+    assert daily_rep.panel_cache_hits == 0
+    daily_rep.render_project_panel(projects[2])
+    assert daily_rep.panel_cache_hits == 1
+
+
+def test_compact_report():
+    project = _project("NGI0001", {"2023-05-01": ["Library QC finished"]})
+    report = daily_report.DailyReport().populate_and_write_report(
+        "pi@example.com", _report_data([project]), STATUS_PRIORITY
+    )
+
+    compact_rep = daily_report.DailyReport(compact=True)
+    compact_report = compact_rep.populate_and_write_report("pi@example.com", _report_data([project]), STATUS_PRIORITY)
+
+    assert len(compact_report) < len(report)
+    assert compact_rep.report_bytes == len(compact_report.encode("utf-8"))
+    assert "  " not in compact_report
+    assert "<!--[if lt IE 9]>" in compact_report
+    assert "panel_project_NGI0001" in compact_report
+
+
+def test_minify_html_keeps_preformatted_text():
+    html = "<div>\n  <!-- comment -->\n  <pre>a\n  b</pre>\n</div>"
+    assert daily_report.minify_html(html) == "<div> <pre>a\n  b</pre> </div>"
+
+
+def test_panel_cache_is_kept_between_runs(tmp_path):
+    panel_cache_path = os.path.join(tmp_path, "panels.json.gz")
+    projects = [_project(f"NGI000{i}", {"2023-05-01": ["Samples Received"]}) for i in range(3)]
+
+    daily_rep = daily_report.DailyReport(panel_cache_path=panel_cache_path)
+    report = daily_rep.populate_and_write_report("pi@example.com", _report_data(projects), STATUS_PRIORITY)
+    daily_rep.save_panel_cache()
+
+    # The next run only renders the changed project
+    projects[2] = _project("NGI0002", {"2023-05-01": ["Samples Received"], "2023-05-02": ["Library QC finished"]})
+    daily_rep = daily_report.DailyReport(panel_cache_size=3, panel_cache_path=panel_cache_path)
+    new_report = daily_rep.populate_and_write_report("pi@example.com", _report_data(projects), STATUS_PRIORITY)
+    assert (daily_rep.panel_cache_hits, daily_rep.panel_cache_misses) == (2, 1)
+    assert "2023-05-02" in new_report and "2023-05-02" not in report
+
+    # Panels rendered with another template are not reused
+    daily_rep.save_panel_cache()
+    daily_rep = daily_report.DailyReport(panel_cache_path=panel_cache_path)
+    daily_rep._template_hash = "changed"
+    daily_rep.populate_and_write_report("pi@example.com", _report_data(projects), STATUS_PRIORITY)
+    assert daily_rep.panel_cache_hits == 0
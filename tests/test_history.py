@@ -0,0 +1,58 @@
+import datetime
+import json
+import os
+
+import git
+
+from daily_read import history
+from daily_read.ngi_data import ProjectDataRecord
+
+
+def _commit_project(data_repo, relative_path, project_dates):
+    file_path = os.path.join(data_repo.working_dir, relative_path)
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    with open(file_path, "w") as fh:
+        json.dump({"orderer": "pi@example.com", "project_dates": project_dates}, fh)
+    data_repo.index.add([relative_path])
+    data_repo.index.commit(f"Update {relative_path}")
+
+
+def test_history_index(tmp_path):
+    data_repo = git.Repo.init(os.path.join(tmp_path, "git_repo"))
+    index_path = os.path.join(tmp_path, "history.json.gz")
+
+    _commit_project(data_repo, "NGIS/2023/NGI0001.json", {"2023-01-01": ["Samples Received"]})
+    _commit_project(data_repo, "SNPSEQ/2023/SNP0001.json", {"2023-01-05": ["Samples Received"]})
+
+    index = history.ProjectHistoryIndex(index_path)
+    assert index.update(data_repo) == 2
+    index.save()
+
+    _commit_project(
+        data_repo,
+        "NGIS/2023/NGI0001.json",
+        {"2023-01-01": ["Samples Received"], "2023-01-11": ["Library QC finished"]},
+    )
+
+    # Only the new commit is read when loading the saved index again
+    index = history.ProjectHistoryIndex(index_path)
+    assert index.update(data_repo) == 1
+    assert index.update(data_repo) == 0
+    assert len(index) == 3
+
+    assert index.turnaround_times("Samples Received", "Library QC finished") == {"NGI0001": 10}
+    assert index.turnaround_summary("Samples Received", "Library QC finished") == {"NGIS": (1, 10, 10)}
+    assert index.stuck_in("Library QC finished", 30, today=datetime.date(2023, 3, 1)) == [("NGI0001", "2023-01-11")]
+    assert index.stuck_in("Library QC finished", 30, today=datetime.date(2023, 1, 20)) == []
+
+
+def test_current_status_matches_project_record(tmp_path):
+    data_repo = git.Repo.init(os.path.join(tmp_path, "git_repo"))
+    project_dates = {"2023-01-01": ["Samples Received"], "2023-01-11": ["Library QC finished", "All Samples Sequenced"]}
+    _commit_project(data_repo, "NGIS/2023/NGI0001.json", project_dates)
+
+    index = history.ProjectHistoryIndex(os.path.join(tmp_path, "history.json.gz"))
+    index.update(data_repo)
+
+    record = ProjectDataRecord("NGIS/2023/NGI0001.json", "pi@example.com", project_dates)
+    assert index.current_statuses() == {"NGI0001": (record.status, "2023-01-11")}
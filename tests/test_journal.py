@@ -0,0 +1,32 @@
+import os
+
+from daily_read import journal
+
+
+def test_resume_from_journal(tmp_path):
+    journal_path = os.path.join(tmp_path, "journal.json")
+    run_journal = journal.RunJournal(journal_path)
+    assert not run_journal.load()
+
+    run_journal.start()
+    run_journal.record_saved_files(["NGIS/2023/NGI0002.json", "NGIS/2023/NGI0001.json"])
+    run_journal.stage_completed("data_saved")
+    run_journal.record_orderer("pi_1@example.com", True, ["NGIS/2023/NGI0001.json"])
+    run_journal.record_orderer("pi_2@example.com", False, ["NGIS/2023/NGI0002.json"])
+
+    # A new process picks up where the previous one stopped
+    resumed_journal = journal.RunJournal(journal_path)
+    assert resumed_journal.load()
+    assert resumed_journal.is_completed("data_saved")
+    assert resumed_journal.saved_files == ["NGIS/2023/NGI0001.json", "NGIS/2023/NGI0002.json"]
+    assert resumed_journal.delivered_orderers() == {"pi_1@example.com"}
+
+    # Failed orderers are retried, their old outcome should not remain if they get no report this time
+    resumed_journal.forget_orderers(["pi_2@example.com"])
+    reloaded_journal = journal.RunJournal(journal_path)
+    assert reloaded_journal.load()
+    assert list(reloaded_journal.orderers) == ["pi_1@example.com"]
+
+    resumed_journal.finish()
+    assert not os.path.exists(journal_path)
+    assert not journal.RunJournal(journal_path).load()
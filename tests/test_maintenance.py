@@ -0,0 +1,52 @@
+import datetime
+import glob
+import os
+
+import git
+
+from daily_read import maintenance
+
+
+def _commit_file(data_repo, relative_path, content, commit_date):
+    file_path = os.path.join(data_repo.working_dir, relative_path)
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    with open(file_path, "w") as fh:
+        fh.write(content)
+    data_repo.index.add([relative_path])
+    data_repo.index.commit(f"Update {relative_path}", author_date=commit_date, commit_date=commit_date)
+
+
+def test_maintenance(tmp_path):
+    data_repo = git.Repo.init(os.path.join(tmp_path, "git_repo"))
+    old_date = (datetime.datetime.now() - datetime.timedelta(days=100)).isoformat(timespec="seconds")
+    new_date = datetime.datetime.now().isoformat(timespec="seconds")
+    for i in range(5):
+        _commit_file(data_repo, f"NGIS/2023/NGI000{i}.json", f'{{"old": {i}}}', old_date)
+    for i in range(5):
+        _commit_file(data_repo, f"NGIS/2023/NGI000{i}.json", f'{{"new": {i}}}', new_date)
+
+    # Written by another run that has not committed yet
+    pending_path = os.path.join(tmp_path, "pending.json")
+    with open(pending_path, "w") as fh:
+        fh.write('{"pending": 1}')
+    pending_object = data_repo.git.hash_object("-w", pending_path)
+
+    repo_maintenance = maintenance.DataRepoMaintenance(data_repo, max_loose_objects=10)
+    assert repo_maintenance.object_counts()["count"] > 10
+    assert len(repo_maintenance.reasons_for_maintenance()) == 2
+
+    counts = repo_maintenance.run(retention_days=30)
+    assert counts["count"] == 1
+    data_repo.git.cat_file("-e", pending_object)
+    assert repo_maintenance.reasons_for_maintenance() == []
+    assert data_repo.config_reader().get_value("core", "untrackedCache") is True
+
+    # The old history is kept in its own pack
+    pack_dir = os.path.join(data_repo.git_dir, "objects", "pack")
+    assert len(glob.glob(os.path.join(pack_dir, "*.keep"))) == 1
+    assert counts["packs"] == 2
+    assert repo_maintenance.archive_history(30) is None
+
+    # GitPython can still read the repository
+    assert not data_repo.is_dirty()
+    assert len(list(data_repo.iter_commits())) == 10
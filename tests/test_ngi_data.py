@@ -1,10 +1,11 @@
+import concurrent.futures
 import os
 
 import dotenv
 import git
 import pytest
 
-from daily_read import ngi_data, config
+from daily_read import ngi_data, config, data_writer
 
 dotenv.load_dotenv()
 
@@ -241,6 +242,56 @@ def test_modified_or_new_tracked(data_repo_tracked):
     assert len(set(file_names)) == 0
 
 
+def test_project_file_writer(tmp_path):
+    data_location = os.path.join(tmp_path, "data")
+    tmp_dir = os.path.join(tmp_path, "tmp")
+    records = [
+        ngi_data.ProjectDataRecord(f"NGIS/2023/NGI000{i}.json", "pi@example.com", {"2023-05-01": ["Samples Received"]})
+        for i in range(5)
+    ]
+
+    writer = data_writer.ProjectFileWriter(data_location, tmp_dir, max_workers=2)
+    assert writer.write(records) == 5
+    assert os.listdir(tmp_dir) == []
+
+    orderer, project_dates, _, _ = ngi_data.ProjectDataRecord.data_from_file(
+        os.path.join(data_location, "NGIS/2023/NGI0003.json")
+    )
+    assert orderer == "pi@example.com"
+    assert project_dates == {"2023-05-01": ["Samples Received"]}
+
+    # Only changed records are rewritten
+    records[0].project_dates["2023-05-02"] = ["Reception Control finished"]
+    assert writer.write(records) == 1
+
+
+def test_project_file_writers_sharing_tmp_dir(tmp_path, monkeypatch):
+    data_location = os.path.join(tmp_path, "data")
+    tmp_dir = os.path.join(tmp_path, "tmp")
+    records = [
+        ngi_data.ProjectDataRecord(f"NGIS/2023/NGI{i:04d}.json", "pi@example.com", {"2023-05-01": ["Samples Received"]})
+        for i in range(200)
+    ]
+
+    # Writers in other processes (e.g. shards) write the same files at the same time
+    writers = [data_writer.ProjectFileWriter(data_location, tmp_dir, max_workers=4) for _ in range(4)]
+    with concurrent.futures.ThreadPoolExecutor(max_workers=4) as executor:
+        list(executor.map(lambda writer: writer.write(records), writers))
+    assert len(os.listdir(os.path.join(data_location, "NGIS", "2023"))) == 200
+    assert os.listdir(tmp_dir) == []
+
+    # Temporary files are removed when writing fails
+    def failing_replace(src, dst):
+        raise OSError("Disk full")
+
+    records[0].project_dates["2023-05-02"] = ["Reception Control finished"]
+    records[1].project_dates["2023-05-02"] = ["Reception Control finished"]
+    monkeypatch.setattr(data_writer.os, "replace", failing_replace)
+    with pytest.raises(OSError):
+        writers[0].write(records)
+    assert os.listdir(tmp_dir) == []
+
+
 # Planned tests #
 
 
@@ -0,0 +1,72 @@
+import datetime
+import json
+import types
+
+import pytest
+
+from daily_read import config, ngi_data, order_portal
+
+
+def _chunked(text, chunk_size):
+    return [text[i : i + chunk_size] for i in range(0, len(text), chunk_size)]
+
+
+def test_iter_json_items():
+    items = [
+        {"identifier": "NGI0001", "status": "closed", "history": {"closed": "2023-01-02"}, "reports": []},
+        {"identifier": "NGI0002", "status": "accepted", "price": 1234, "reports": [{"name": "x", "iuid": "1"}]},
+    ]
+    text = json.dumps(
+        {"data": {"nested": [1, 2]}, "ratio": 1.5, "limit": 2.5e-10, "items": items, "total": 2}, indent=2
+    )
+
+    # Splitting in chunks at any position should give the same result
+    for chunk_size in range(1, len(text) + 1):
+        assert list(order_portal.iter_json_items(_chunked(text, chunk_size))) == items
+
+
+def test_iter_json_items_numbers_split_between_chunks():
+    assert list(order_portal.iter_json_items(['{"total": 1.', '5, "items": []}'])) == []
+    assert list(order_portal.iter_json_items(['{"total": 1e', '3, "items": [2.', "25]}"])) == [2.25]
+    assert list(order_portal.iter_json_items(['{"items": [12', "34, -1.5E", "+2]}"])) == [1234, -150.0]
+
+
+def test_iter_json_items_empty_and_invalid():
+    assert list(order_portal.iter_json_items(['{"items": []}'])) == []
+    assert list(order_portal.iter_json_items(["{}"])) == []
+
+    with pytest.raises(json.JSONDecodeError):
+        list(order_portal.iter_json_items(['{"items": [{"identifier": "NGI0001"}']))
+
+    with pytest.raises(json.JSONDecodeError):
+        list(order_portal.iter_json_items(["<html>Bad gateway</html>"]))
+
+
+def test_process_orders():
+    today = datetime.date.today()
+    recently = (today - datetime.timedelta(days=5)).isoformat()
+    long_ago = (today - datetime.timedelta(days=100)).isoformat()
+
+    data = {}
+    for portal_id, orderer in [("NGI0001", "pi_1"), ("NGI0002", "pi_1"), ("NGI0003", "pi_2")]:
+        project_dates = {long_ago: ["Samples Received"], recently: ["Library QC finished"]}
+        data[portal_id] = ngi_data.ProjectDataRecord(f"NGIS/2023/{portal_id}.json", orderer, project_dates)
+
+    config_values = config.Config()
+    config_values.ORDER_PORTAL_URL = "https://orderportal.example.com"
+    config_values.ORDER_PORTAL_API_KEY = "x"
+    op = order_portal.OrderPortal(config_values, projects_data=types.SimpleNamespace(data=data))
+    op.all_orders = [
+        op._project_order({"identifier": "NGI0001", "status": "accepted", "history": {}, "reports": []}),
+        op._project_order({"identifier": "NGI0002", "status": "closed", "history": {"closed": long_ago}}),
+        op._project_order(
+            {"identifier": "NGI0003", "status": "closed", "history": {"closed": f"{recently}T10:00:00"}, "reports": []}
+        ),
+    ]
+
+    order_updates = op.process_orders()
+
+    assert set(order_updates) == {"pi_1"}
+    assert order_updates["pi_1"]["active_projects"] == 2
+    assert order_updates["pi_1"]["recents"][0][0] == recently
+    assert len(order_updates["pi_1"]["recents"]) == 4
@@ -0,0 +1,51 @@
+import threading
+import time
+
+from daily_read import pipeline
+
+
+def test_pipeline_runs_all_items_through_all_stages():
+    def double(key, value):
+        return [(key, value * 2)]
+
+    def split(key, value):
+        return [(key, value), (key, value + 1)]
+
+    stages = [pipeline.Stage("double", double, nr_workers=3), pipeline.Stage("split", split, nr_workers=2)]
+    results = list(pipeline.Pipeline(stages, queue_size=2).run((i, i) for i in range(20)))
+
+    assert sorted(results) == sorted([(i, 2 * i) for i in range(20)] + [(i, 2 * i + 1) for i in range(20)])
+
+
+def test_pipeline_reports_failures_and_continues():
+    def fail_on_odd(key, value):
+        if key % 2:
+            raise ValueError(f"odd key {key}")
+        return [(key, value)]
+
+    results = list(
+        pipeline.Pipeline([pipeline.Stage("check", fail_on_odd, nr_workers=2)]).run((i, None) for i in range(6))
+    )
+
+    failures = [result for result in results if isinstance(result, pipeline.Failure)]
+    assert sorted(failure.key for failure in failures) == [1, 3, 5]
+    assert all(failure.stage_name == "check" for failure in failures)
+    assert sorted(result[0] for result in results if not isinstance(result, pipeline.Failure)) == [0, 2, 4]
+
+
+def test_pipeline_overlaps_stages():
+    first_result_at = []
+    start = time.monotonic()
+
+    def slow(key, value):
+        time.sleep(0.05)
+        return [(key, value)]
+
+    stages = [pipeline.Stage("first", slow), pipeline.Stage("second", slow)]
+    for _ in pipeline.Pipeline(stages).run((i, None) for i in range(5)):
+        first_result_at.append(time.monotonic() - start)
+
+    # The first item is done long before all items have passed the first stage
+    assert first_result_at[0] < 0.2
+    # Sum of stages would be 0.5 s, overlapped it is about 0.3 s
+    assert first_result_at[-1] < 0.45
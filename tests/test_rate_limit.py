@@ -0,0 +1,78 @@
+import datetime
+import threading
+import types
+
+import pytest
+
+from daily_read import rate_limit
+
+
+def _response(status_code, retry_after=None):
+    headers = {} if retry_after is None else {"Retry-After": retry_after}
+    return types.SimpleNamespace(status_code=status_code, headers=headers, close=lambda: None)
+
+
+def test_parse_retry_after():
+    now = datetime.datetime(2023, 5, 4, 10, 0, 0, tzinfo=datetime.timezone.utc)
+    assert rate_limit.parse_retry_after("3") == 3.0
+    assert rate_limit.parse_retry_after("Thu, 04 May 2023 10:00:30 GMT", now=now) == 30.0
+    assert rate_limit.parse_retry_after("soon") is None
+    assert rate_limit.parse_retry_after(None) is None
+
+
+def test_limiter_backs_off_and_retries_when_throttled():
+    limiter = rate_limit.AdaptiveLimiter(initial_concurrency=8, requests_per_second=1000)
+    responses = iter([_response(429, retry_after="0"), _response(503, retry_after="0"), _response(200)])
+
+    response = limiter.send("api/v1/orders", lambda: next(responses))
+
+    assert response.status_code == 200
+    assert limiter.stats()["requests"] == 3
+    assert limiter.stats()["throttled"] == 2
+    assert limiter.stats()["concurrency_limit"] == 2
+
+
+def test_limiter_increases_concurrency_on_fast_responses():
+    limiter = rate_limit.AdaptiveLimiter(initial_concurrency=1, max_concurrency=3, requests_per_second=1000)
+    for _ in range(20):
+        limiter.send("api/v1/report", lambda: _response(200))
+
+    assert limiter.stats()["concurrency_limit"] == 3
+    assert limiter.stats()["requests_per_second"] > 0
+
+
+def test_limiter_halves_once_per_round_trip():
+    limiter = rate_limit.AdaptiveLimiter(initial_concurrency=8, requests_per_second=1000, max_retries=0)
+    # All requests are in flight at the same time when the service starts throttling
+    all_sent = threading.Barrier(8)
+
+    def send_request():
+        all_sent.wait()
+        return _response(429, retry_after="0")
+
+    threads = [threading.Thread(target=limiter.send, args=("api/v1/report", send_request)) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert limiter.stats()["throttled"] == 8
+    assert limiter.stats()["concurrency_limit"] == 4
+
+    # A request sent after the decrease can lower it again
+    limiter.send("api/v1/report", lambda: _response(429, retry_after="0"))
+    assert limiter.stats()["concurrency_limit"] == 2
+
+
+def test_limiter_backs_off_when_requests_fail():
+    limiter = rate_limit.AdaptiveLimiter(initial_concurrency=8, requests_per_second=1000)
+
+    def send_request():
+        raise ConnectionResetError("Connection reset by peer")
+
+    with pytest.raises(ConnectionResetError):
+        limiter.send("api/v1/orders", send_request)
+
+    assert limiter.stats()["requests"] == 1
+    assert limiter.stats()["concurrency_limit"] == 4
+    assert limiter.in_flight == 0
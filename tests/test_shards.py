@@ -0,0 +1,50 @@
+import pytest
+
+from daily_read import shards
+
+
+def test_parse_shard():
+    assert shards.parse_shard("2/4") == (2, 4)
+
+    for invalid_shard in ["0/4", "5/4", "1/0", "2", "a/b"]:
+        with pytest.raises(ValueError):
+            shards.parse_shard(invalid_shard)
+
+
+def test_orderers_in_shard_is_a_partition():
+    orderers = [f"pi_{i}@example.com" for i in range(100)] + [None]
+    nr_shards = 4
+
+    seen = []
+    for shard_index in range(1, nr_shards + 1):
+        seen += shards.orderers_in_shard(orderers, shard_index, nr_shards)
+
+    assert sorted(seen) == sorted(orderers[:-1])
+    assert shards.shard_for_orderer("pi_1@example.com", nr_shards) == shards.shard_for_orderer(
+        "pi_1@example.com", nr_shards
+    )
+
+
+def test_merge_shard_outcomes(tmp_path):
+    shard_outcomes = shards.ShardOutcomes(str(tmp_path))
+    assert shard_outcomes.read_saved_files() is None
+    shard_outcomes.write_saved_files(["NGIS/2023/NGI0001.json", "NGIS/2023/NGI0002.json"])
+    assert shard_outcomes.read_saved_files() == ["NGIS/2023/NGI0001.json", "NGIS/2023/NGI0002.json"]
+
+    shard_outcomes.write(1, 2, {"pi_1@example.com": {"uploaded": True, "files": ["NGIS/2023/NGI0001.json"]}})
+
+    outcomes = shard_outcomes.read_all()
+    assert shard_outcomes.missing_shards(outcomes) == ["2/2"]
+
+    shard_outcomes.write(2, 2, {"pi_2@example.com": {"uploaded": False, "files": ["NGIS/2023/NGI0002.json"]}})
+    outcomes = shard_outcomes.read_all()
+    assert shard_outcomes.missing_shards(outcomes) == []
+
+    files_to_stage, uploaded_orderers, failed_orderers = shard_outcomes.merge(outcomes)
+    assert files_to_stage == ["NGIS/2023/NGI0001.json"]
+    assert uploaded_orderers == ["pi_1@example.com"]
+    assert failed_orderers == ["pi_2@example.com"]
+
+    shard_outcomes.clear(outcomes)
+    assert shard_outcomes.read_all() == []
+    assert shard_outcomes.read_saved_files() is None
@@ -0,0 +1,63 @@
+import datetime
+import types
+
+from daily_read import statusdb
+
+
+class FakeDatabase(object):
+    """Answers view queries like CouchDB does for the keys given"""
+
+    def __init__(self, keys):
+        self.keys = sorted(keys, reverse=True)
+        self.nr_queries = 0
+
+    def view(self, name, descending=True, startkey=None, endkey=None, inclusive_end=True):
+        self.nr_queries += 1
+        rows = []
+        for key in self.keys:
+            if startkey is not None and key > startkey:
+                continue
+            if key < endkey or (key == endkey and not inclusive_end):
+                continue
+            rows.append(types.SimpleNamespace(key=key))
+        return types.SimpleNamespace(rows=rows)
+
+
+def _session(keys, partition_days):
+    session = object.__new__(statusdb.StatusDBSession)
+    session.page_size = 0
+    session.partition_days = partition_days
+    session.partition_workers = 4
+    session.db_connection = FakeDatabase(keys)
+    return session
+
+
+def test_date_windows():
+    session = _session([], partition_days=365)
+    windows = session.date_windows("2020-01-01", today=datetime.date(2022, 6, 1))
+
+    assert windows[0] == {"endkey": ["2022-06-01", "ZZZZ"], "inclusive_end": False}
+    assert windows[1] == {"startkey": ["2022-06-01", "ZZZZ"], "endkey": ["2021-12-31", "ZZZZ"], "inclusive_end": False}
+    assert windows[-1] == {"startkey": ["2020-12-31", "ZZZZ"], "endkey": ["2020-01-01", "ZZZZ"], "inclusive_end": True}
+    assert len(windows) == 4
+
+
+def test_partitioned_rows_match_single_query():
+    today = datetime.date.today()
+    keys = [[(today - datetime.timedelta(days=days)).isoformat(), "P"] for days in range(0, 3650, 7)]
+    # Boundaries of the query and open projects sorting after all dates
+    keys += [[(today - datetime.timedelta(days=3000)).isoformat(), "ZZZZ"], [today.isoformat(), "ZZZZ"], ["open", "P"]]
+    close_date = (today - datetime.timedelta(days=3000)).isoformat()
+
+    single = _session(keys, partition_days=0)
+    expected = [row.key for row in single.rows(close_date=close_date)]
+    assert single.db_connection.nr_queries == 1
+
+    partitioned = _session(keys, partition_days=365)
+    assert [row.key for row in partitioned.rows(close_date=close_date)] == expected
+    assert partitioned.db_connection.nr_queries == 10
+
+    # A short lookback is still a single query
+    recent = _session(keys, partition_days=365)
+    recent.rows(close_date=(today - datetime.timedelta(days=180)).isoformat())
+    assert recent.db_connection.nr_queries == 1
@@ -0,0 +1,91 @@
+import gzip
+import os
+
+import pytest
+
+from daily_read import config, ngi_data, ugc
+
+EXPORT = """portal_id\torderer\tstatus\tdate\tproject_id\tproject_name\torder_year
+UGC0001\tpi@example.com\tSamples Received\t2023-01-02\tUP-1\tA.Name_23_01\t2022
+UGC0001\tpi@example.com\tLibrary QC finished\t2023-01-10 12:00:00\tUP-1\tA.Name_23_01\t2022
+UGC0002\tother@example.com\tSamples Received\t2023-02-01\t\t\t
+UGC0003\tother@example.com\tAll Raw data Delivered\t2020-02-01\t\t\t
+"""
+
+
+def _write_export(exports_location, file_name, content):
+    export_path = os.path.join(exports_location, file_name)
+    with open(export_path, "w") as fh:
+        fh.write(content)
+    return export_path
+
+
+def test_parse_export(tmp_path):
+    export_path = _write_export(tmp_path, "ugc.tsv", EXPORT)
+    projects = ugc.parse_export(export_path)
+
+    assert projects["UGC0001"] == {
+        "orderer": "pi@example.com",
+        "project_dates": {"2023-01-02": ["Samples Received"], "2023-01-10": ["Library QC finished"]},
+        "internal_id": "UP-1",
+        "internal_name": "A.Name_23_01",
+        "order_year": "2022",
+    }
+    assert projects["UGC0002"]["internal_id"] is None
+
+    # Comma separated and compressed exports give the same result
+    export_path = os.path.join(tmp_path, "ugc.csv.gz")
+    with gzip.open(export_path, "wt") as fh:
+        fh.write(EXPORT.replace("\t", ","))
+    assert ugc.parse_export(export_path) == projects
+
+    export_path = _write_export(tmp_path, "bad.tsv", "portal_id\tstatus\nUGC0001\tSamples Received\n")
+    with pytest.raises(ValueError):
+        ugc.parse_export(export_path)
+
+
+def test_unchanged_exports_are_not_parsed(tmp_path):
+    exports_location = os.path.join(tmp_path, "exports")
+    os.mkdir(exports_location)
+    cache_path = os.path.join(tmp_path, "cache.json.gz")
+    _write_export(exports_location, "node1.tsv", EXPORT)
+    export_path = _write_export(
+        exports_location,
+        "node2.tsv",
+        EXPORT.split("\n")[0] + "\nUGC0001\tpi@example.com\tAll Samples Sequenced\t2023-01-20\n",
+    )
+
+    exports = ugc.UGCExports(exports_location, cache_path)
+    projects = exports.projects()
+    assert exports.nr_parsed == 2
+    assert projects["UGC0001"]["project_dates"]["2023-01-20"] == ["All Samples Sequenced"]
+    assert len(projects["UGC0001"]["project_dates"]) == 3
+
+    # Same content but a new modification time, only the checksum is computed
+    os.utime(export_path, ns=(0, 0))
+    exports = ugc.UGCExports(exports_location, cache_path)
+    assert exports.projects() == projects
+    assert exports.nr_parsed == 0
+
+    os.remove(export_path)
+    exports = ugc.UGCExports(exports_location, cache_path)
+    assert "2023-01-20" not in exports.projects()["UGC0001"]["project_dates"]
+    assert list(exports.cache) == ["node1.tsv"]
+
+
+def test_ugc_project_data(tmp_path):
+    exports_location = os.path.join(tmp_path, "exports")
+    os.mkdir(exports_location)
+    _write_export(exports_location, "ugc.tsv", EXPORT)
+
+    config_values = config.Config()
+    config_values.UGC_EXPORTS_LOCATION = exports_location
+    config_values.CACHE_LOCATION = str(tmp_path)
+    data = ngi_data.UGCProjectData(config_values).get_data(close_date="2023-01-01")
+
+    # Delivered before the close date
+    assert "UGC0003" not in data
+    assert data["UGC0001"].relative_path == "UGC/2022/UGC0001.json"
+    assert data["UGC0001"].status == "Library QC finished"
+    assert data["UGC0001"].internal_name == "A.Name_23_01"
+    assert data["UGC0002"].relative_path == "UGC/2023/UGC0002.json"